@@ -1,22 +1,29 @@
 import ast
-import pickle
+import hashlib
+import json
+import os
 import re
+import zlib
 import xml.etree.ElementTree as ET
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from tempfile import TemporaryDirectory as TmpDir
+from typing import Callable
 from zipfile import ZipFile
 
 import pandas as pd
 
+from dataset import ITERATION_DTYPES, SUITE_DTYPES, has_trial, write_suites, write_trial
+
 ITER_COUNT = 25
+# salt of all cache keys: increment on any change of the parsing (get_execution_dict, get_coverage_dict, ...)
+PARSER_VERSION = 1
 LIFT_OUTPUT = Path("<<LIFT_OUTPUT_PATH>>")
+ANALYSIS_OUTPUT = Path("<<DATA_OUTPUT_PATH>>")
 
-analysis_output = Path("<<DATA_OUTPUT_PATH>>")
-analysis_output.mkdir(exist_ok=True)
-
-reqs_output = (analysis_output / "reqs").resolve()
-reqs_output.mkdir(exist_ok=True)
+NUMERIC_COLUMNS = ['errors', 'tests_failed', 'tests_skipped', 'tests_total', 'exec_time',
+                   'line_valid', 'line_covered', 'line_cov', 'branch_valid', 'branch_covered', 'branch_cov']
 
 
 def get_execution_dict(exec_xml):
@@ -65,111 +72,179 @@ def get_coverage_dict(cov_xml):
     return {mapping[k]: v for k, v in cleaned.items()}
 
 
-overall_stats = dict()
-for trial in [e for e in LIFT_OUTPUT.glob("archive_*") if e.is_dir()]:
-    trial_id = int(re.search(r"archive_(\d+)", trial.name).group(1))
+def read_blob(trial, digest):
+    """ Reads a file content from the blob store of a trial archive. """
+    return zlib.decompress((trial / "blobs" / digest[:2] / digest[2:]).read_bytes())
 
-    fss, lps = (trial / "_FSS_"), (trial / "_LPS_")
 
-    reports_zips = [*trial.glob("reports_*.zip")]
-    tests_zips = [*trial.glob("tests_*.zip")]
+def suite_iteration(trial, name):
+    """ Returns the iteration of an archived suite (FSS/LPS) or None if not available. """
+    manifest = trial / "manifests" / f"{name}.json"
+    if manifest.exists():
+        return json.loads(manifest.read_text())["iteration"]
 
-    if len(reports_zips) != len(tests_zips):
-        print(f"❌ Trial {trial_id:>02d}: Not the same number of test and report iterations found!")
-        continue
+    # legacy archive (_FSS_/FSS_yy)
+    marker = [*(trial / f"_{name}_").glob(f"{name}_*")]
+    return int(re.search(rf"{name}_(\d+)", marker[0].name).group(1)) if marker else None
 
-    if len(reports_zips) != ITER_COUNT:
-        print(f"❌ Trial {trial_id:>02d}: Less then {ITER_COUNT} iterations executed!")
-        continue
 
-    iteration_data = {i: dict() for i in range(25)}
-    iteration_reqs = {i: dict() for i in range(25)}
-    for reports_zip in reports_zips:
+def cache_key(*parts):
+    """ Returns the cache key of the parts, salted with the parser version. """
+    return hashlib.sha256(repr((PARSER_VERSION, *parts)).encode()).hexdigest()
+
+
+def report_sources(trial):
+    """ Returns the reports of all iterations of a trial archive as {iteration: (key, read)}, with key - the cache key
+    of the reports manifest (content) or zip of a legacy archive (path, mtime & size) and read - reading a report file
+    without extracting it (None if missing). """
+    sources = dict()
+    for manifest in (trial / "manifests").glob("reports_*.json"):
+        iteration = int(re.search(r"reports_(\d+)\.json", manifest.name).group(1))
+        content = manifest.read_bytes()
+        files = json.loads(content)["files"]
+        sources[iteration] = (cache_key(content),
+                              lambda name, files=files: read_blob(trial, files[name]) if name in files else None)
+
+    for reports_zip in trial.glob("reports_*.zip"):
         iteration = int(re.search(r"reports_(\d+)\.zip", reports_zip.name).group(1))
 
-        with TmpDir() as tmpdir:
-            tmp_path = Path(tmpdir)
+        def read(name, reports_zip=reports_zip):
             with ZipFile(reports_zip, "r") as zip_ref:
-                zip_ref.extractall(tmp_path)
+                member = next((m for m in zip_ref.namelist() if Path(m).name == name), None)
+                return zip_ref.read(member) if member is not None else None
 
-            exec_path = tmp_path / "execution-report.xml"
-            cov_path = tmp_path / "coverage-report.xml"
-            fixes, evaluation = (tmp_path / "fixes.md"), (tmp_path / "evaluation.md")
+        stat = reports_zip.stat()
+        sources[iteration] = (cache_key(str(reports_zip.resolve()), stat.st_mtime_ns, stat.st_size), read)
 
-            if not exec_path.exists():
-                print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
-                      f"No execution report found!")
-            else:
-                exec_df, reqs = get_execution_dict(exec_path)
-                iteration_data[iteration].update(exec_df)
-                iteration_reqs[iteration].update(reqs)
+    return sources
 
-            if not cov_path.exists():
-                print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
-                      f"No coverage report found!")
-            else:
-                iteration_data[iteration].update(get_coverage_dict(cov_path))
 
-            if not fixes.exists() and not evaluation.exists():
-                print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
-                      f"No agent feedback (neither fixes.md nor evaluation.md) found!")
-                fixing, final = True, None  # assume fixing is done
-            else:
-                fixing = True if fixes.exists() else None
-                final = ("<FINAL>" in evaluation.read_text("UTF-8")) if evaluation.exists() else None
+def parse_iteration(trial_id, iteration, read: Callable[[str], bytes | None]):
+    """ Parses the reports & agent feedback of an iteration. Returns its data and requirement mapping. """
+    data, reqs = dict(), dict()
+
+    exec_xml, cov_xml = read("execution-report.xml"), read("coverage-report.xml")
+    fixes, evaluation = read("fixes.md"), read("evaluation.md")
+
+    if exec_xml is None:
+        print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
+              f"No execution report found!")
+    else:
+        exec_df, reqs = get_execution_dict(BytesIO(exec_xml))
+        data.update(exec_df)
+
+    if cov_xml is None:
+        print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
+              f"No coverage report found!")
+    else:
+        data.update(get_coverage_dict(BytesIO(cov_xml)))
+
+    if fixes is None and evaluation is None:
+        print(f"⚠️ Trial {trial_id:>02d}, Iteration {iteration:>02d}: "
+              f"No agent feedback (neither fixes.md nor evaluation.md) found!")
+        fixing, final = True, None  # assume fixing is done
+    else:
+        fixing = True if fixes is not None else None
+        final = ("<FINAL>" in evaluation.decode("UTF-8")) if evaluation is not None else None
+
+    data.update({"fixing": fixing, "final": final})
+    return data, reqs
 
-            iteration_data[iteration].update({"fixing": fixing, "final": final})
 
-    df = pd.DataFrame.from_dict(iteration_data, orient="index",
-                                columns=['errors', 'fixing', 'final', 'tests_total', 'tests_failed', 'tests_skipped',
-                                         'exec_time', 'unit', 'integration', 'system', 'line_valid', 'line_covered',
-                                         'line_cov', 'branch_valid', 'branch_covered', 'branch_cov'])
+def cached_iteration(cache, key, trial_id, iteration, read):
+    """ Returns the parsed iteration from the cache (keyed by the reports key), parsing it on a cache miss. """
+    cache_file = cache / f"{key}.json"
+    if cache_file.exists():
+        entry = json.loads(cache_file.read_text())
+        return entry["data"], entry["reqs"]
 
-    numeric_cols = ['errors', 'tests_failed', 'tests_skipped', 'tests_total', 'exec_time',
-                    'line_valid', 'line_covered', 'line_cov', 'branch_valid', 'branch_covered', 'branch_cov']
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
+    data, reqs = parse_iteration(trial_id, iteration, read)
+    write_cache(cache_file, dict(data=data, reqs=reqs))
+    return data, reqs
+
+
+def write_cache(cache_file, entry):
+    tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(entry))
+    tmp.replace(cache_file)
+
+
+def aggregate_trial(trial, analysis_output):
+    """ Collects the data of all iterations of a trial archive (archive_xx) and stores it (and the requirement
+    mapping) in the trial's partitions of the dataset. Returns the trial id and its FSS/LPS data (None if
+    incomplete). A trial unchanged since the last run (same reports & suites) is neither parsed nor rewritten. """
+    trial_id = int(re.search(r"archive_(\d+)", trial.name).group(1))
+
+    sources = report_sources(trial)
+    tests_count = len([*(trial / "manifests").glob("tests_*.json"), *trial.glob("tests_*.zip")])
+
+    if len(sources) != tests_count:
+        print(f"❌ Trial {trial_id:>02d}: Not the same number of test and report iterations found!")
+        return trial_id, None
+
+    if len(sources) != ITER_COUNT:
+        print(f"❌ Trial {trial_id:>02d}: Less then {ITER_COUNT} iterations executed!")
+        return trial_id, None
+
+    # unchanged trial: its partitions are up-to-date, only the FSS/LPS data is needed
+    cache = analysis_output / ".cache"
+    suite_iterations = {name: suite_iteration(trial, name) for name in ["FSS", "LPS"]}
+    trial_key = cache_key(sorted((iteration, key) for iteration, (key, _) in sources.items()), suite_iterations)
+    trial_cache = cache / f"trial_{trial_id:02d}.json"
+    if trial_cache.exists() and has_trial(analysis_output, trial_id):
+        entry = json.loads(trial_cache.read_text())
+        if entry["key"] == trial_key:
+            print(f"✅ Trial {trial_id:>02d}: Unchanged, data already stored")
+            return trial_id, pd.Series(entry["suites"], dtype=object)
+
+    iteration_data = {i: dict() for i in range(ITER_COUNT)}
+    iteration_reqs = {i: dict() for i in range(ITER_COUNT)}
+    for iteration, (key, read) in sources.items():
+        iteration_data[iteration], iteration_reqs[iteration] = cached_iteration(cache, key, trial_id, iteration, read)
+
+    df = pd.DataFrame.from_dict(iteration_data, orient="index", columns=list(ITERATION_DTYPES))
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric)
     df.index.name = "iteration"
     df.sort_index(inplace=True)
 
-    out_csv = analysis_output / f"trial_{trial_id:>02d}.csv"
-    df.to_csv(out_csv)
+    reqs = pd.DataFrame([(iteration, test, req) for iteration, tests in iteration_reqs.items()
+                         for test, test_reqs in tests.items() for req in test_reqs],
+                        columns=["iteration", "test", "requirement"])
 
-    out_pkl = reqs_output / f"trial_{trial_id:>02d}.pkl"
-    with open(out_pkl, "wb") as file:
-        pickle.dump(iteration_reqs, file)
-    print(f"✅ Trial {trial_id:>02d}: Data collected and stored in {out_csv} & {out_pkl}")
+    out = write_trial(analysis_output, trial_id, df, reqs)
+    print(f"✅ Trial {trial_id:>02d}: Data collected and stored in {out}")
 
-    if fss.exists():
-        iteration = int(re.search(r"FSS_(\d+)", list(fss.glob("FSS_*"))[0].name).group(1))
-        fss_data = df.loc[iteration].copy()
-        fss_data["iteration"] = iteration
-    else:
-        fss_data = pd.Series({col: None for col in df.columns})
+    suites = []
+    for name, iteration in suite_iterations.items():
+        if iteration is not None:
+            suite_data = df.loc[iteration].copy()
+            suite_data["iteration"] = iteration
+        else:
+            suite_data = pd.Series({col: None for col in df.columns})
+        suites.append(suite_data.drop(["fixing", "final"]).add_prefix(f"{name.lower()}_"))
 
-    if lps.exists():
-        iteration = int(re.search(r"LPS_(\d+)", list(lps.glob("LPS_*"))[0].name).group(1))
-        lps_data = df.loc[iteration].copy()
-        lps_data["iteration"] = iteration
-    else:
-        lps_data = pd.Series({col: None for col in df.columns})
-
-    fss_data = fss_data.drop(["fixing", "final"]).add_prefix("fss_")
-    lps_data = lps_data.drop(["fixing", "final"]).add_prefix("lps_")
-
-    overall_stats[trial_id] = fss_data.combine_first(lps_data)
-
-overall = pd.DataFrame.from_dict(overall_stats, orient="index",
-                                 columns=['fss_iteration', 'fss_errors', 'fss_tests_total', 'fss_tests_failed',
-                                          'fss_tests_skipped', 'fss_exec_time', 'fss_unit', 'fss_integration',
-                                          'fss_system', 'fss_line_valid', 'fss_line_covered', 'fss_line_cov',
-                                          'fss_branch_valid', 'fss_branch_covered', 'fss_branch_cov', 'lps_iteration',
-                                          'lps_errors', 'lps_tests_total', 'lps_tests_failed', 'lps_tests_skipped',
-                                          'lps_exec_time', 'lps_unit', 'lps_integration', 'lps_system',
-                                          'lps_line_valid', 'lps_line_covered', 'lps_line_cov', 'lps_branch_valid',
-                                          'lps_branch_covered', 'lps_branch_cov'])
-overall.index.name = "trial"
-overall.sort_index(inplace=True)
-
-out_csv = analysis_output / "fss_lps_all_trials.csv"
-overall.to_csv(out_csv)
-print(f"\n✅ Data Collection done for all trials! Overall statistics stored in {out_csv}")
+    suites = suites[0].combine_first(suites[1])
+    write_cache(trial_cache, dict(key=trial_key, suites=json.loads(suites.to_json())))
+    return trial_id, suites
+
+
+def aggregate(lift_output, analysis_output, workers=None):
+    """ Aggregates the data of all trial archives (in parallel, one trial per process) and stores the FSS & LPS data
+    of all trials in suites.parquet. Reports parsed (and trials stored) in a previous run are read from the cache. """
+    (analysis_output / ".cache").mkdir(parents=True, exist_ok=True)
+
+    trials = [e for e in lift_output.glob("archive_*") if e.is_dir()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(aggregate_trial, trials, [analysis_output] * len(trials))
+        overall_stats = {trial_id: stats for trial_id, stats in results if stats is not None}
+
+    overall = pd.DataFrame.from_dict(overall_stats, orient="index", columns=list(SUITE_DTYPES))
+    overall.index.name = "trial"
+    overall.sort_index(inplace=True)
+
+    out = write_suites(analysis_output, overall)
+    print(f"\n✅ Data Collection done for all trials! Overall statistics stored in {out}")
+
+
+if __name__ == "__main__":
+    aggregate(LIFT_OUTPUT, ANALYSIS_OUTPUT)
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pandas as pd
+
+# columnar dataset of the aggregated trial data (written by data_aggregation.py, Parquet, partitioned by trial):
+#   iterations/trial=xx/data.parquet    (test & coverage data per iteration)
+#   requirements/trial=xx/data.parquet  (requirements of every test per iteration)
+#   suites.parquet                      (FSS & LPS data of all trials)
+ITERATION_DTYPES = {"errors": "Int32", "fixing": "boolean", "final": "boolean", "tests_total": "Int32",
+                    "tests_failed": "Int32", "tests_skipped": "Int32", "exec_time": "Float64", "unit": "Int32",
+                    "integration": "Int32", "system": "Int32", "line_valid": "Int32", "line_covered": "Int32",
+                    "line_cov": "Float64", "branch_valid": "Int32", "branch_covered": "Int32", "branch_cov": "Float64"}
+SUITE_DTYPES = {f"{suite}_{col}": dtype for suite in ["fss", "lps"]
+                for col, dtype in {"iteration": "Int32", **ITERATION_DTYPES}.items() if col not in ["fixing", "final"]}
+REQUIREMENT_DTYPES = {"iteration": "Int32", "test": "string", "requirement": "string"}
+
+
+def _partition(data_path: Path, table: str, trial_id: int) -> Path:
+    return data_path / table / f"trial={trial_id:02d}" / "data.parquet"
+
+
+def write_trial(data_path: Path, trial_id: int, iterations: pd.DataFrame, requirements: pd.DataFrame) -> Path:
+    """ Writes (replaces) the partitions of a trial. """
+    for table, df, dtypes in [("iterations", iterations.reset_index(), {"iteration": "Int32", **ITERATION_DTYPES}),
+                              ("requirements", requirements, REQUIREMENT_DTYPES)]:
+        out = _partition(data_path, table, trial_id)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        df.astype(dtypes)[list(dtypes)].to_parquet(out, index=False)
+    return _partition(data_path, "iterations", trial_id).parent
+
+
+def has_trial(data_path: Path, trial_id: int) -> bool:
+    """ Whether the partitions of a trial are stored. """
+    return all(_partition(data_path, table, trial_id).exists() for table in ["iterations", "requirements"])
+
+
+def write_suites(data_path: Path, suites: pd.DataFrame) -> Path:
+    out = data_path / "suites.parquet"
+    suites.astype(SUITE_DTYPES).to_parquet(out)
+    return out
+
+
+def _load_partitioned(data_path: Path, table: str, columns: list[str] | None) -> pd.DataFrame:
+    df = pd.read_parquet(data_path / table, columns=None if columns is None else ["trial", *columns])
+    return df.astype({"trial": int})
+
+
+def load_iterations(data_path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """ Loads the iteration data of all trials (optionally only some columns), indexed by (trial, iteration). """
+    columns = None if columns is None else ["iteration", *columns]
+    return _load_partitioned(data_path, "iterations", columns).set_index(["trial", "iteration"]).sort_index()
+
+
+def load_requirements(data_path: Path) -> pd.DataFrame:
+    """ Loads the requirement mapping (trial, iteration, test, requirement) of all trials. """
+    return _load_partitioned(data_path, "requirements", None)
+
+
+def load_suites(data_path: Path) -> pd.DataFrame:
+    """ Loads the FSS & LPS data of all trials (one row per trial, NA if a trial has no FSS/LPS). """
+    return pd.read_parquet(data_path / "suites.parquet").reset_index()
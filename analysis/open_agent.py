@@ -1,8 +1,40 @@
-from pickle import load
+import gzip
+import json
+from pathlib import Path
 
-agent = None
+# conversation log of an agent (e.g. .archive/archive_00/conversations/03_generator.jsonl.gz)
+CONVERSATION = Path("<<ARCHIVED_CONVERSATION_PATH>>")
 
-with open("<<ARCHIVED_AGENTS_PATH>>", "rb") as file:
-    agent = load(file)
 
+def read_conversation(path: Path) -> list[dict]:
+    """ Reads all records of a conversation log (a truncated last member of a crashed run is skipped). """
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                records.append(json.loads(line))
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+        pass
+    return records
+
+
+def read_record(path: Path, seq: int) -> dict | None:
+    """ Reads a single record by its sequence number (only decompressing its gzip member, found via the index). """
+    with open(path.with_suffix(".idx")) as index:
+        for entry in map(json.loads, index):
+            if entry["seq"] <= seq < entry["seq"] + entry["count"]:
+                with open(path, "rb") as file:
+                    file.seek(entry["offset"])
+                    lines = gzip.decompress(file.read(entry["length"])).decode("utf-8").splitlines()
+                return json.loads(lines[seq - entry["seq"]])
+    return None
+
+
+records = read_conversation(CONVERSATION)
+header = next((r for r in records if r["kind"] == "header"), None)
+messages = [r["message"] for r in records if r["kind"] == "message"]
+end = next((r for r in records if r["kind"] == "end"), None)
+
+print(f"{header['agent'] if header else '?'}: {len(messages)} messages, "
+      f"{'finished' if end else 'not finished (interrupted)'}")
 print(" + Set breakpoint here! + ")
@@ -1,4 +1,3 @@
-import re
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -6,24 +5,17 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from dataset import load_iterations
+
 data_path = Path("<<DATA_OUTPUT_PATH>>").resolve()
 plots_path = Path("<<PLOTS_PATH>>").resolve()
 
-# collect trial data into lift_df
-lift_df = pd.DataFrame()
-for trial_csv in data_path.glob("trial_*.csv"):
-    trial_id = int(re.search(r"trial_(\d+)\.csv", trial_csv.name).group(1))
-    trial_df = pd.read_csv(trial_csv, index_col="iteration")
-
-    # get total number of tests (cleared total for iteration with errors => pytest total reporting incorrect here)
-    trial_df.loc[trial_df["errors"] > 0, "tests_total"] = None
-    tests = trial_df["tests_total"]
-
-    df = pd.DataFrame({"tests_total": tests}).assign(trial_id=trial_id) \
-        .set_index("trial_id", append=True).reorder_levels(["trial_id", "iteration"])
-    lift_df = pd.concat([lift_df, df])
+# load trial data into lift_df
+lift_df = load_iterations(data_path, ["errors", "tests_total"])
 
-del trial_df, tests, df
+# get total number of tests (cleared total for iteration with errors => pytest total reporting incorrect here)
+lift_df.loc[lift_df["errors"].fillna(0) > 0, "tests_total"] = None
+lift_df = lift_df[["tests_total"]]
 
 
 ### plot individual trials ###
@@ -31,8 +23,8 @@ def individual_plot():
     plt.figure(figsize=(9, 6))
     sns.set_theme()
 
-    palette = sns.color_palette("husl", n_colors=len(lift_df.index.get_level_values("trial_id").unique()))
-    sns.lineplot(data=lift_df.reset_index(), x="iteration", y="tests_total", hue="trial_id", legend=False,
+    palette = sns.color_palette("husl", n_colors=len(lift_df.index.get_level_values("trial").unique()))
+    sns.lineplot(data=lift_df.reset_index(), x="iteration", y="tests_total", hue="trial", legend=False,
                  alpha=0.7, marker="o", palette=palette)
     plt.xlabel(r"Iteration $k$")
     plt.ylabel(r"Test count $t$")
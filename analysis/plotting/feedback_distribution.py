@@ -1,33 +1,29 @@
-import re
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
+from dataset import load_iterations
+
 data_path = Path("<<DATA_OUTPUT_PATH>>").resolve()
 plots_path = Path("<<PLOTS_PATH>>").resolve()
 
-# collect trial data into lift_df
-lift_df = pd.DataFrame()
-for trial_csv in data_path.glob("trial_*.csv"):
-    trial_id = int(re.search(r"trial_(\d+)\.csv", trial_csv.name).group(1))
-    trial_df = pd.read_csv(trial_csv, index_col="iteration")
+# load trial data into lift_df
+trials_df = load_iterations(data_path, ["final"])
 
-    # nan => fix feedback in this iteration
-    fix = trial_df["final"].isna().astype(int)
+# nan => fix feedback in this iteration
+fix = trials_df["final"].isna().astype(int)
 
-    # get the cumulative sum (over the iterations) of fixes
-    fix_cum = fix.cumsum()
+# get the cumulative sum (over the iterations) of fixes per trial
+fix_cum = fix.groupby("trial").cumsum()
 
-    # rate = cumulative sum over number of iterations (i.e. x times fixing in y iterations => x/y)
-    fix_cum_rate = fix_cum / (fix.index.astype(int) + 1)
+# rate = cumulative sum over number of iterations (i.e. x times fixing in y iterations => x/y)
+fix_cum_rate = fix_cum / (fix.index.get_level_values("iteration").to_numpy(dtype=int) + 1)
 
-    df = pd.DataFrame({"fix": fix, "fix_cum": fix_cum, "fix_cum_rate": fix_cum_rate}).assign(trial_id=trial_id) \
-        .set_index("trial_id", append=True).reorder_levels(["trial_id", "iteration"])
-    lift_df = pd.concat([lift_df, df]) if lift_df is not None else df
+lift_df = pd.DataFrame({"fix": fix, "fix_cum": fix_cum, "fix_cum_rate": fix_cum_rate})
 
-del trial_df, fix, fix_cum, fix_cum_rate, df
+del trials_df, fix, fix_cum, fix_cum_rate
 
 # get the mean values per iteration over all trials
 iter_df = lift_df.groupby("iteration").mean()
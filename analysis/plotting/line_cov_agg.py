@@ -1,4 +1,3 @@
-import re
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -6,24 +5,17 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from dataset import load_iterations
+
 data_path = Path("<<DATA_OUTPUT_PATH>>").resolve()
 plots_path = Path("<<PLOTS_PATH>>").resolve()
 
-# collect trial data into lift_df
-lift_df = pd.DataFrame()
-for trial_csv in data_path.glob("trial_*.csv"):
-    trial_id = int(re.search(r"trial_(\d+)\.csv", trial_csv.name).group(1))
-    trial_df = pd.read_csv(trial_csv, index_col="iteration")
-
-    # get total number of tests (cleared total for iteration with errors => pytest total reporting incorrect here)
-    trial_df.loc[trial_df["errors"] > 0, "line_cov"] = None
-    coverage = trial_df["line_cov"]
-
-    df = pd.DataFrame({"line_cov": coverage}).assign(trial_id=trial_id) \
-        .set_index("trial_id", append=True).reorder_levels(["trial_id", "iteration"])
-    lift_df = pd.concat([lift_df, df])
+# load trial data into lift_df
+lift_df = load_iterations(data_path, ["errors", "line_cov"])
 
-del trial_df, coverage, df
+# get total number of tests (cleared total for iteration with errors => pytest total reporting incorrect here)
+lift_df.loc[lift_df["errors"].fillna(0) > 0, "line_cov"] = None
+lift_df = lift_df[["line_cov"]]
 
 # get the mean & quantiles values per iteration over all trials
 plot_df = pd.DataFrame(index=range(25))
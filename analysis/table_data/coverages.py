@@ -1,15 +1,18 @@
 from pathlib import Path
 
-import pandas as pd
+from dataset import load_suites
 
 data_path = Path("<<DATA_OUTPUT_PATH>>").resolve()
 tables_path = Path("<<TABLES_PATH>>").resolve()
 
 # collect data
-lift_df = pd.read_csv(data_path / "fss_lps_all_trials.csv")
+lift_df = load_suites(data_path)
 
 
 def create_coverage_table(df, caption, label, file_name):
+    # numpy floats, as the (non-integer) mean & median rows are appended
+    df = df.astype({col: "float64" for col in df.columns if col != "trial"})
+
     # get mean and median
     mean, median = df.mean(), df.median()
     mean["trial"], median["trial"] = "mean", "median"
@@ -1,3 +1,4 @@
 from .process import Process
+from .trials import TrialScheduler
 
-__all__ = [Process]
+__all__ = [Process, TrialScheduler]
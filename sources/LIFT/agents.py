@@ -1,25 +1,37 @@
+import asyncio
 import json
 from abc import abstractmethod, ABC
 from enum import Enum, auto
 from logging import getLogger
 from pathlib import Path
-from time import sleep
+from time import sleep, perf_counter
 from typing import Any
 
-from litellm import responses
-from openai import RateLimitError
+from litellm import responses, aresponses
+from openai import RateLimitError, APIStatusError, APIConnectionError
 from openai.types.responses import ResponseOutputMessage, ResponseFunctionToolCall, ResponseReasoningItem, Response, \
     ResponseOutputText
 
-from .models import Model, litellm_model
+from .compaction import compact_messages, estimate_tokens
+from .conversation_log import ConversationLog
+from .metrics import AgentMetrics, CallMetrics
+from .models import Model, AnthropicModel, litellm_model
 from .prompts import GeneratorPrompts, DebuggerPrompts, EvaluatorPrompts
 from .project_utils import ToolCallResult
-from .tools import TOOLS_SPEC, TOOLS_IMPL
+from .rate_limits import provider_slot, get_rate_limiter, response_headers, retry_after, is_retryable, backoff
+from .tools import TOOLS_SPEC, TOOLS_IMPL, READ_ONLY_TOOLS
+from .tree_index import TREE_INDEX
 
 MAX_STEPS = 50
 MAX_RETRIES = 5
+CONTEXT_BUDGET = 100_000  # est. tokens of the conversation before tool outputs are compacted
+KEEP_RECENT_OUTPUTS = 6
 REDACT_MAX_PREVIEW = 120
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
+END_RESULTS = [ToolCallResult.END_ACCEPTED, ToolCallResult.END_FINAL_SUITE, ToolCallResult.END_REWORK_REQ]
+
 
 def _preview(s: str, limit: int = REDACT_MAX_PREVIEW) -> str:
     if len(s) <= limit:
@@ -39,6 +51,11 @@ def _redact_tool_args(name: str, args: dict) -> dict:
             a["find"] = f"<len {len(a['find'])}>"
         if "replace" in a:
             a["replace"] = f"<len {len(a['replace'])}>"
+    if name == "apply_edits":
+        # show per-edit paths & lengths only
+        a["edits"] = [{"path": e.get("path"),
+                       **{k: f"<len {len(e[k])}>" for k in ["find", "replace", "diff"] if k in e}}
+                      for e in a.get("edits") or []]
     # read_file/read_many/list_dir/delete_path are fine as-is
     return a
 
@@ -84,25 +101,69 @@ def _redact_tool_result(name: str, result: dict) -> dict:
     return result
 
 
+def _mark_cacheable(messages: list, floor: int = 0) -> list:
+    """ Returns a copy of the messages with cache_control markers on the system prompt, the latest dict message and
+    the last dict message before floor (the end of the prefix not changed by the compaction). """
+    marked = list(messages)
+
+    system = marked[0]
+    marked[0] = {**system, "content": [{"type": "input_text", "text": system["content"],
+                                        "cache_control": CACHE_CONTROL}]}
+
+    for end in [floor, len(marked)]:
+        for i in range(end - 1, 0, -1):
+            if isinstance(marked[i], dict):
+                marked[i] = {**marked[i], "cache_control": CACHE_CONTROL}
+                break
+
+    return marked
+
+
 class Agent(ABC):
     type_: str
 
-    def __init__(self, api_key: str, model: Model, prompts, logger_name: str):
+    def __init__(self, api_key: str, model: Model, prompts, logger_name: str, parallel_tools: bool = False):
         self._api_key = api_key
         self._model = model
         self._prompts = prompts
         self._logger = getLogger(logger_name)
+        self._parallel_tools = parallel_tools
+        self.metrics = AgentMetrics()
 
         self._logger.debug(f"System prompt: {_preview(repr(prompts.system))}")
         self._messages = [{"role": "system", "content": prompts.system}]
 
+        self._conversation: ConversationLog | None = None
+        self._logged = 0  # number of messages already written to the conversation log
+        self._cache_floor = 0  # messages before are only compacted if inevitable (keeps the cached prompt prefix)
+
+    def record_conversation(self, log: ConversationLog, **meta) -> None:
+        """ Writes the conversation (incrementally, while querying) to the log. """
+        self._conversation = log
+        log.append([{"kind": "header", "agent": self.type_, "model": litellm_model(self._model), **meta}])
+
+    def _flush_conversation(self) -> None:
+        """ Appends the messages added since the last flush to the conversation log (before they get compacted). """
+        if self._conversation is None or self._logged == len(self._messages):
+            return
+        self._conversation.append_messages(self._messages[self._logged:])
+        self._logged = len(self._messages)
+
+    def finish_conversation(self) -> None:
+        """ Flushes the remaining messages and closes the conversation log with the agent's metrics. """
+        if self._conversation is None:
+            return
+        self._flush_conversation()
+        self._conversation.append([{"kind": "end", "metrics": self.metrics.to_dict()}])
+
     @abstractmethod
     def _handle_end_conv_attempt(self, final_text: str) -> tuple[ToolCallResult, Any]:
         ...
 
-    def _handle_tool_call(self, tool_call: ResponseFunctionToolCall) -> ToolCallResult:
-        """ Handles a tool call by the agent. Returns the ToolCallResult."""
+    def _call_tool(self, tool_call: ResponseFunctionToolCall) -> tuple[ToolCallResult, Any, float]:
+        """ Executes a tool call by the agent. Returns the ToolCallResult, the result of the tool and its duration. """
         end: ToolCallResult
+        start = perf_counter()
 
         # get function & arguments
         name = tool_call.name
@@ -125,67 +186,232 @@ class Agent(ABC):
             self._logger.error(f"[TOOL ERROR] - {name} failed: {e}")
             end = ToolCallResult.CALL_ERROR
 
-        # append function call & response
+        return end, result, perf_counter() - start
+
+    def _append_tool_output(self, tool_call: ResponseFunctionToolCall, result: Any) -> None:
         self._messages.append({
             "type": "function_call_output",
             "call_id": tool_call.call_id,
             "output": json.dumps(result)
         })
 
+    def _handle_tool_call(self, tool_call: ResponseFunctionToolCall) -> ToolCallResult:
+        """ Handles a tool call by the agent. Returns the ToolCallResult."""
+        end, result, duration = self._call_tool(tool_call)
+        self.metrics.add_tool(tool_call.name, duration, end == ToolCallResult.CALL_ERROR)
+
+        # append function call & response
+        self._append_tool_output(tool_call, result)
+
         return end
 
+    def _compact(self) -> None:
+        """ Compacts the tool outputs (if over budget) and moves the cache floor to the end of the compacted messages,
+        so later compactions do not change the (then cached) prefix. """
+        if compact_messages(self._messages, CONTEXT_BUDGET, KEEP_RECENT_OUTPUTS, self._logger, self._cache_floor):
+            self._cache_floor = len(self._messages)
+
+    def _request_args(self, parallel_tool_calls: bool) -> dict:
+        """ Returns the request arguments incl. the provider-specific prompt caching hints for the stable prefix. """
+        args = dict(model=litellm_model(self._model), tools=TOOLS_SPEC, tool_choice="auto",
+                    parallel_tool_calls=parallel_tool_calls)
+
+        if isinstance(self._model, AnthropicModel):
+            # explicit cache breakpoints: tool specs, system prompt, compaction floor & latest message (incl. previous
+            # tool outputs)
+            args["input"] = _mark_cacheable(self._messages, self._cache_floor)
+            args["tools"] = [*TOOLS_SPEC[:-1], {**TOOLS_SPEC[-1], "cache_control": CACHE_CONTROL}]
+        else:
+            # automatic prefix caching, route requests with the same prefix (system prompt) together
+            args["input"] = self._messages
+            args["prompt_cache_key"] = f"lift-{self.type_.lower()}"
+
+        return args
+
+    def _record_usage(self, step: int, response: Response, latency: float, retry_wait: float, retries: int) -> None:
+        call = CallMetrics.from_usage(response.usage, latency, retry_wait, retries)
+        self.metrics.add_call(call)
+
+        self._logger.info(f"[STATE #{step}] - Total tokens used: {response.usage.total_tokens} "
+                          f"(input: {call.input_tokens}, cached: {call.cached_tokens}, "
+                          f"cache written: {call.cache_write_tokens}, output: {call.output_tokens}, "
+                          f"reasoning: {call.reasoning_tokens}) in {latency:.2f} secs")
+
+    def _retry_wait(self, e: Exception, retry: int, limiter) -> float:
+        """ Logs the failed request. Returns the time (in secs) to wait before retrying (re-raises if not retryable or
+        if it was the last attempt). """
+        if not is_retryable(e):
+            raise e
+
+        wait = backoff(retry, retry_after(e))
+        if isinstance(e, RateLimitError):
+            # pause all requests to this model (incl. other agents/trials)
+            limiter.penalize(wait)
+            self._logger.info(f"[RATE LIMIT HIT] - {_preview(str(e))}")
+        else:
+            self._logger.info(f"[REQUEST FAILED] - {_preview(str(e))}")
+
+        if retry == MAX_RETRIES - 1:
+            self._logger.error(f"[RETRIES EXHAUSTED] - Giving up after {MAX_RETRIES} attempts")
+            raise e
+
+        self._logger.info(f"[RETRY #{retry}] - Waiting for {wait:.2f} secs")
+        return wait
+
+    def _log_output(self, content) -> bool:
+        """ Logs a (non tool call) output item of the model. Returns True if the agent needs to be instructed to use
+        the end_conversation tool. """
+        instruct_end = False
+
+        if isinstance(content, ResponseOutputMessage):
+            message = content
+            for m_content in message.content:
+                if isinstance(m_content, ResponseOutputText):
+                    self._logger.info(f"[RESPONSE MESSAGE] - {m_content.text}")
+                    if any([t in m_content.text for t in ["<DONE>", "<REWORK>", "<FINAL>"]]):
+                        self._logger.info("[USER INFO] - Instructed use of end_conversation tool "
+                                          "after final_text was found in text message.")
+                        instruct_end = True
+                else:
+                    self._logger.info(f"[RESPONSE MESSAGE REFUSAL] - {m_content.refusal}")
+
+        elif isinstance(content, ResponseReasoningItem):
+            self._logger.info(f"[REASONING] - summary: {content.summary}, content: {content.content}")
+
+        else:
+            self._logger.debug(f"[EVENT] - {content}")
+
+        return instruct_end
+
+    def _instruct_end(self) -> None:
+        self._messages.append({"role": "user", "content": "To end a conversation, "
+                                                          "use the `end_conversation` tool!"})
+
     def _query(self):
+        # the project may have been changed outside the tools since the last conversation (test execution, restore)
+        TREE_INDEX.clear()
+        try:
+            if self._parallel_tools:
+                return asyncio.run(self._aquery())
+            return self._squery()
+        finally:
+            self._flush_conversation()
+
+    def _squery(self):
+        """ Synchronous agent loop (sequential tool calls). """
         for step in range(MAX_STEPS):
-            response = None
+            self._flush_conversation()
+            self._compact()
+
+            response, latency, waited = None, 0.0, 0.0
+            # reserved once per step, the retries only wait while the requests are blocked
+            limiter = get_rate_limiter(self._model)
+            wait = limiter.reserve(estimate_tokens(self._messages))
             for retry in range(MAX_RETRIES):
+                wait = wait if retry == 0 else limiter.blocked()
+                if wait > 0:
+                    self._logger.info(f"[PACING] - Waiting for {wait:.2f} secs to respect the rate limits")
+                    sleep(wait)
+                    waited += wait
+
                 try:
-                    response: Response = responses(model=litellm_model(self._model), input=self._messages,
-                                                   tools=TOOLS_SPEC, tool_choice="auto", parallel_tool_calls=False)
+                    with provider_slot(self._model):
+                        start = perf_counter()
+                        response: Response = responses(**self._request_args(parallel_tool_calls=False))
+                        latency = perf_counter() - start
+                    limiter.update(response_headers(response))
                     break
-                except RateLimitError as e:
-                    self._logger.info(
-                        f"[RATE LIMIT HIT] - {e.message.split('{\'message\': \'')[1].split('Visit')[0].strip()}")
-
-                    time = str(e.message).split("Please try again in")[1].strip().split("s")[0]
-                    wait = 5
-                    if "m" not in time:
-                        wait += float(time.replace("m", ""))
-                    self._logger.info(f"[RETRY #{retry}] - Waiting for {wait:.2f} secs")
+                except (APIStatusError, APIConnectionError) as e:
+                    wait = self._retry_wait(e, retry, limiter)
                     sleep(wait)
+                    waited += wait
                     self._logger.info(f"[RETRY #{retry}] - Waited for {wait:.2f} secs")
 
-            if response is None:
-                raise Exception("No response from model to process!")
-
-            self._logger.info(f"[STATE #{step}] - Total tokens used: {response.usage.total_tokens}")
+            self._record_usage(step, response, latency, waited, retry)
 
             for content in response.output:
                 self._messages.append(content)
 
-                if isinstance(content, ResponseOutputMessage):
-                    message = content
-                    for m_content in message.content:
-                        if isinstance(m_content, ResponseOutputText):
-                            self._logger.info(f"[RESPONSE MESSAGE] - {m_content.text}")
-                            if any([t in m_content.text for t in ["<DONE>", "<REWORK>", "<FINAL>"]]):
-                                self._logger.info("[USER INFO] - Instructed use of end_conversation tool "
-                                                  "after final_text was found in text message.")
-                                self._messages.append({"role": "user", "content": "To end a conversation, "
-                                                                                  "use the `end_conversation` tool!"})
-                        else:
-                            self._logger.info(f"[RESPONSE MESSAGE REFUSAL] - {m_content.refusal}")
-
-                elif isinstance(content, ResponseReasoningItem):
-                    self._logger.info(f"[REASONING] - summary: {content.summary}, content: {content.content}")
-
-                elif isinstance(content, ResponseFunctionToolCall):
+                if isinstance(content, ResponseFunctionToolCall):
                     end = self._handle_tool_call(content)
-                    if end in [ToolCallResult.END_ACCEPTED, ToolCallResult.END_FINAL_SUITE,
-                               ToolCallResult.END_REWORK_REQ]:
+                    if end in END_RESULTS:
                         return end
 
-                else:
-                    self._logger.debug(f"[EVENT] - {content}")
+                elif self._log_output(content):
+                    self._instruct_end()
+
+        self._logger.error(f"[FORCED STOP] - Automatically ended conversation after {MAX_STEPS} steps")
+        return ToolCallResult.END_ACCEPTED
+
+    async def _ahandle_tool_calls(self, tool_calls: list[ResponseFunctionToolCall]) -> ToolCallResult | None:
+        """ Handles the (parallel) tool calls of one response. Consecutive read-only tool calls are executed
+        concurrently, all others in order. Returns the ToolCallResult ending the conversation (if any). """
+        i = 0
+        while i < len(tool_calls):
+            # collect batch of consecutive read-only calls (or a single other call)
+            batch = [tool_calls[i]]
+            if tool_calls[i].name in READ_ONLY_TOOLS:
+                while i + len(batch) < len(tool_calls) and tool_calls[i + len(batch)].name in READ_ONLY_TOOLS:
+                    batch.append(tool_calls[i + len(batch)])
+            i += len(batch)
+
+            results = await asyncio.gather(*[asyncio.to_thread(self._call_tool, call) for call in batch])
+
+            for call, (end, result, duration) in zip(batch, results):
+                self.metrics.add_tool(call.name, duration, end == ToolCallResult.CALL_ERROR)
+                self._append_tool_output(call, result)
+                if end in END_RESULTS:
+                    return end
+
+        return None
+
+    async def _aquery(self):
+        """ Async variant of _squery allowing parallel tool calls (executing read-only tools concurrently). """
+        for step in range(MAX_STEPS):
+            self._flush_conversation()
+            self._compact()
+
+            response, latency, waited = None, 0.0, 0.0
+            # reserved once per step, the retries only wait while the requests are blocked
+            limiter = get_rate_limiter(self._model)
+            wait = limiter.reserve(estimate_tokens(self._messages))
+            for retry in range(MAX_RETRIES):
+                wait = wait if retry == 0 else limiter.blocked()
+                if wait > 0:
+                    self._logger.info(f"[PACING] - Waiting for {wait:.2f} secs to respect the rate limits")
+                    await asyncio.sleep(wait)
+                    waited += wait
+
+                try:
+                    with provider_slot(self._model):
+                        start = perf_counter()
+                        response: Response = await aresponses(**self._request_args(parallel_tool_calls=True))
+                        latency = perf_counter() - start
+                    limiter.update(response_headers(response))
+                    break
+                except (APIStatusError, APIConnectionError) as e:
+                    wait = self._retry_wait(e, retry, limiter)
+                    await asyncio.sleep(wait)
+                    waited += wait
+                    self._logger.info(f"[RETRY #{retry}] - Waited for {wait:.2f} secs")
+
+            self._record_usage(step, response, latency, waited, retry)
+
+            tool_calls, instruct_end = [], False
+            for content in response.output:
+                self._messages.append(content)
+
+                if isinstance(content, ResponseFunctionToolCall):
+                    tool_calls.append(content)
+                elif self._log_output(content):
+                    instruct_end = True
+
+            end = await self._ahandle_tool_calls(tool_calls)
+            if end is not None:
+                return end
+
+            if instruct_end:
+                self._instruct_end()
 
         self._logger.error(f"[FORCED STOP] - Automatically ended conversation after {MAX_STEPS} steps")
         return ToolCallResult.END_ACCEPTED
@@ -200,8 +426,9 @@ class GeneratorState(Enum):
 class Generator(Agent):
     type_ = "GENERATOR"
 
-    def __init__(self, api_key: str, model: Model, prompts: GeneratorPrompts, iteration: int):
-        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}")
+    def __init__(self, api_key: str, model: Model, prompts: GeneratorPrompts, iteration: int,
+                 parallel_tools: bool = False):
+        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}", parallel_tools)
 
     def run(self, state: GeneratorState):
         instrs = {GeneratorState.INIT: self._prompts.init, GeneratorState.ERROR: self._prompts.error,
@@ -220,8 +447,9 @@ class Generator(Agent):
 class Debugger(Agent):
     type_ = "DEBUGGER"
 
-    def __init__(self, api_key: str, model: Model, prompts: DebuggerPrompts, reports: Path, iteration: int):
-        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}")
+    def __init__(self, api_key: str, model: Model, prompts: DebuggerPrompts, reports: Path, iteration: int,
+                 parallel_tools: bool = False):
+        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}", parallel_tools)
         self._reports = reports
 
     def debug(self):
@@ -244,8 +472,9 @@ class Debugger(Agent):
 class Evaluator(Agent):
     type_ = "EVALUATOR"
 
-    def __init__(self, api_key: str, model: Model, prompts: EvaluatorPrompts, reports: Path, iteration: int):
-        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}")
+    def __init__(self, api_key: str, model: Model, prompts: EvaluatorPrompts, reports: Path, iteration: int,
+                 parallel_tools: bool = False):
+        super().__init__(api_key, model, prompts, self.type_ + f" #{iteration:02d}", parallel_tools)
         self._reports = reports
 
     def evaluate(self):
@@ -0,0 +1,84 @@
+import atexit
+from logging import getLogger
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable
+
+LOGGER = getLogger(__name__)
+
+QUEUE_SIZE = 16
+
+
+class ArchiveWorker:
+    """ Background thread executing the archiving jobs (in submission order), so the iteration loop does not wait for
+    the blob store. The queue is bounded: the loop only blocks if the archiving falls behind by QUEUE_SIZE jobs. The
+    jobs get a snapshot of their inputs (captured on submission), so the project can be changed meanwhile. """
+
+    def __init__(self, size: int = QUEUE_SIZE):
+        self._jobs: Queue = Queue(size)
+        self._thread = Thread(target=self._serve, name="lift-archiver", daemon=True)
+        self.failed = 0
+
+    def start(self) -> None:
+        self._thread.start()
+        LOGGER.debug("Archive worker started")
+
+    def _serve(self) -> None:
+        while True:
+            job, args = self._jobs.get()
+            try:
+                if job is None:
+                    break
+                job(*args)
+            except Exception as e:
+                self.failed += 1
+                LOGGER.error(f"Archiving job {getattr(job, '__qualname__', job)} failed: {e!r}")
+            finally:
+                self._jobs.task_done()
+
+    def submit(self, job: Callable, *args: Any) -> None:
+        self._jobs.put((job, args))
+
+    def flush(self) -> None:
+        """ Waits until all submitted jobs are done. """
+        self._jobs.join()
+
+    def stop(self) -> None:
+        self._jobs.put((None, ()))
+        self._thread.join()
+        LOGGER.debug("Archive worker stopped")
+
+
+WORKER: ArchiveWorker | None = None
+
+
+def init_archive_worker() -> None:
+    global WORKER
+    if WORKER is None:
+        WORKER = ArchiveWorker()
+        WORKER.start()
+        atexit.register(shutdown_archive_worker)
+
+
+def submit_archiving(job: Callable, *args: Any) -> None:
+    """ Executes the archiving job in the background worker (synchronously if no worker is running). """
+    if WORKER is None:
+        job(*args)
+    else:
+        WORKER.submit(job, *args)
+
+
+def flush_archive_worker() -> None:
+    """ Barrier: waits until all archiving jobs submitted so far are written. """
+    if WORKER is not None:
+        WORKER.flush()
+        if WORKER.failed:
+            LOGGER.warning(f"{WORKER.failed} archiving job(s) failed (see log)!")
+
+
+def shutdown_archive_worker() -> None:
+    global WORKER
+    if WORKER is not None:
+        flush_archive_worker()
+        WORKER.stop()
+        WORKER = None
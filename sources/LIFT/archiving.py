@@ -1,10 +1,14 @@
-import pickle
+import json
+import os
 import shutil
 from enum import Enum
 from logging import getLogger
 from pathlib import Path
 
 from .agents import Agent
+from .archive_worker import submit_archiving
+from .blob_store import get_store
+from .conversation_log import ConversationLog
 
 LOGGER = getLogger(__name__)
 
@@ -14,31 +18,53 @@ class SuiteType(Enum):
     LPS = "LPS"
 
 
+def _conversation_file(archive: Path, agent: Agent, iteration: int) -> Path:
+    return archive / f"{iteration:02d}_{agent.type_.lower()}.jsonl.gz"
+
+
+def log_conversation(archive: Path, agent: Agent, iteration: int) -> None:
+    """ Starts the (incrementally written) conversation log of the agent in the archive. """
+    agent.record_conversation(ConversationLog(_conversation_file(archive, agent, iteration)), iteration=iteration)
+
+
 def archive_agent(archive: Path, agent: Agent, iteration: int) -> None:
-    loc = archive / f"{iteration:02d}_{agent.type_.lower()}.pkl"
-    with open(loc, "wb") as file:
-        pickle.dump(agent, file)
+    # the agent is done, i.e. its conversation is not changed anymore while it is written
+    def job():
+        agent.finish_conversation()
+        loc = _conversation_file(archive, agent, iteration)
         LOGGER.info(f"{agent.type_} for iteration {iteration} archived at {loc.absolute()}")
 
+    submit_archiving(job)
+
+
+def write_manifest(archive: Path, name: str, manifest: dict) -> Path:
+    """ Writes (atomically replaces) a manifest (file lists pointing to blobs of the archive's store). """
+    loc = archive / "manifests" / f"{name}.json"
+    loc.parent.mkdir(parents=True, exist_ok=True)
+    tmp = loc.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, loc)
+    return loc
+
 
 def archive_tests(archive: Path, put_tests: Path, iteration: int) -> None:
-    # remove __pycache__ in tests
-    pycache = put_tests / "__pycache__"
-    if pycache.exists():
-        shutil.rmtree(pycache, ignore_errors=True)
+    def job(tests: dict):
+        files = get_store(archive).put_staged(tests)
+        loc = write_manifest(archive, f"tests_{iteration:02d}", dict(iteration=iteration, files=files))
+        LOGGER.info(f"Tests for iteration {iteration} archived at {loc}")
 
-    test_zip = shutil.make_archive(base_name=str(archive / f"tests_{iteration:02d}"),
-                                   format="zip", root_dir=put_tests)
-    LOGGER.info(f"Tests for iteration {iteration} archived at {test_zip}")
+    submit_archiving(job, get_store(archive).stage(put_tests))
 
 
 def archive_reports(archive: Path, put_reports: Path, iteration: int, delete=True) -> None:
-    # zip reports
-    progress_zip = shutil.make_archive(base_name=str(archive / f"reports_{iteration:02d}"),
-                                       format="zip", root_dir=put_reports)
-    LOGGER.info(f"Reports for iteration {iteration} archived at {progress_zip}")
+    def job(reports: dict):
+        files = get_store(archive).put_staged(reports)
+        loc = write_manifest(archive, f"reports_{iteration:02d}", dict(iteration=iteration, files=files))
+        LOGGER.info(f"Reports for iteration {iteration} archived at {loc}")
 
-    # delete reports if wanted
+    submit_archiving(job, get_store(archive).stage(put_reports))
+
+    # delete reports if wanted (the changed ones were already read for the archiving)
     if delete:
         shutil.rmtree(put_reports, ignore_errors=True)
         LOGGER.info(f"Current reports removed from {put_reports.absolute()}")
@@ -46,25 +72,28 @@ def archive_reports(archive: Path, put_reports: Path, iteration: int, delete=Tru
 
 def archive_suite(archive: Path, put_tests: Path, put_reports: Path,
                   type_: SuiteType, iteration: int) -> None:
-    suite_name = "_" + type_.name + "_" + ("new" if type_ == SuiteType.LPS else "")
-    suite_path = (archive / suite_name).resolve()
-
-    # copy reports
-    shutil.copytree(put_reports, suite_path)
-
-    # copy tests
-    shutil.copytree(put_tests, suite_path / "tests")
-    shutil.rmtree(suite_path / "tests" / "__pycache__", ignore_errors=True)
-
-    # create iteration marker
-    open(suite_path / f"{type_.name}_{iteration}", "x")
-
-    # copy new LPS
-    if type_ == SuiteType.LPS:
-        shutil.rmtree(archive / "_LPS_", ignore_errors=True)
-        shutil.move(suite_path, archive / "_LPS_")
-        suite_path = archive / "_LPS_"
-
-        LOGGER.info(f"Updated Last Passing Suite (LPS) for iteration {iteration} at {suite_path.absolute()}")
-    else:
-        LOGGER.info(f"First Sufficient Suite (FSS) for iteration {iteration} archived at {suite_path.absolute()}")
+    # the suite is a manifest of its tests & reports (only the changed files are stored)
+    def job(tests: dict, reports: dict):
+        store = get_store(archive)
+        loc = write_manifest(archive, type_.name, dict(type=type_.name, iteration=iteration,
+                                                       tests=store.put_staged(tests),
+                                                       reports=store.put_staged(reports)))
+
+        if type_ == SuiteType.LPS:
+            LOGGER.info(f"Updated Last Passing Suite (LPS) for iteration {iteration} at {loc.absolute()}")
+        else:
+            LOGGER.info(f"First Sufficient Suite (FSS) for iteration {iteration} archived at {loc.absolute()}")
+
+    store = get_store(archive)
+    submit_archiving(job, store.stage(put_tests), store.stage(put_reports))
+
+
+def checkout_suite(suite: Path, tests: Path, reports: Path | None = None) -> dict:
+    """ Restores the tests (and reports) of an archived suite manifest (e.g. .archive/manifests/LPS.json). Returns
+    the manifest. """
+    manifest = json.loads(suite.read_text())
+    store = get_store(suite.resolve().parent.parent)
+    store.checkout(manifest["tests"], tests)
+    if reports is not None:
+        store.checkout(manifest["reports"], reports)
+    return manifest
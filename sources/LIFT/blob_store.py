@@ -0,0 +1,101 @@
+import hashlib
+import os
+import zlib
+from pathlib import Path
+from threading import Lock, get_ident
+
+
+class BlobStore:
+    """ Content-addressed store of zlib-compressed file contents (blobs/<sha256[:2]>/<sha256[2:]>). A blob is only
+    written once, so snapshots of mostly unchanged trees only write the changed files. Files whose mtime & size did
+    not change since they were stored are not even re-read. """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._stored: dict[Path, tuple[int, int, str]] = dict()  # file -> (mtime, size, digest)
+        self._lock = Lock()
+
+    def _blob(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def put(self, data: bytes) -> str:
+        """ Stores the data (if not yet stored). Returns its digest. """
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._blob(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_name(f"{blob.name}.{os.getpid()}.{get_ident()}.tmp")
+            tmp.write_bytes(zlib.compress(data, 6))
+            os.replace(tmp, blob)
+        return digest
+
+    def put_file(self, file: Path) -> str:
+        stat = file.stat()
+        with self._lock:
+            stored = self._stored.get(file)
+        if stored is not None and stored[:2] == (stat.st_mtime_ns, stat.st_size):
+            return stored[2]
+
+        digest = self.put(file.read_bytes())
+        with self._lock:
+            self._stored[file] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return zlib.decompress(self._blob(digest).read_bytes())
+
+    def snapshot(self, directory: Path) -> dict[str, str]:
+        """ Stores all files of a directory (ignoring __pycache__). Returns the manifest (relative path -> digest). """
+        return {rel: self.put_file(file) for rel, file in _tree(directory)}
+
+    def stage(self, directory: Path) -> dict[str, tuple[Path, tuple[int, int], str | bytes]]:
+        """ Captures the files of a directory (ignoring __pycache__) to store them later with put_staged: only the
+        files changed (mtime & size) since they were stored are read, of the others the digest is taken. """
+        staged = dict()
+        for rel, file in _tree(directory):
+            stat = file.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                stored = self._stored.get(file)
+            staged[rel] = (file, key, stored[2] if stored is not None and stored[:2] == key else file.read_bytes())
+        return staged
+
+    def put_staged(self, staged: dict[str, tuple[Path, tuple[int, int], str | bytes]]) -> dict[str, str]:
+        """ Stores the (changed) files captured by stage. Returns the manifest (relative path -> digest). """
+        files = dict()
+        for rel, (file, key, content) in staged.items():
+            if isinstance(content, str):
+                files[rel] = content
+                continue
+
+            files[rel] = self.put(content)
+            with self._lock:
+                self._stored[file] = (*key, files[rel])
+        return files
+
+    def checkout(self, files: dict[str, str], directory: Path) -> None:
+        """ Writes the files of a manifest to the directory. """
+        directory.mkdir(parents=True, exist_ok=True)
+        for rel, digest in files.items():
+            file = directory / rel
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_bytes(self.get(digest))
+
+
+def _tree(directory: Path) -> list[tuple[str, Path]]:
+    if not directory.exists():
+        return []
+    return [(file.relative_to(directory).as_posix(), file) for file in sorted(directory.rglob("*"))
+            if file.is_file() and "__pycache__" not in file.relative_to(directory).parts]
+
+
+STORES: dict[Path, BlobStore] = dict()
+_STORES_LOCK = Lock()
+
+
+def get_store(archive: Path) -> BlobStore:
+    """ Returns the (shared) blob store of an archive. """
+    with _STORES_LOCK:
+        if archive not in STORES:
+            STORES[archive] = BlobStore(archive / "blobs")
+        return STORES[archive]
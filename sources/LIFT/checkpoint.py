@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass, asdict, field
+from logging import getLogger
+
+from .archive_worker import submit_archiving
+from .blob_store import get_store
+from .paths import Paths
+
+LOGGER = getLogger(__name__)
+
+GENERATION = "generation"
+EXECUTION = "execution"
+DEBUGGING = "debugging"
+EVALUATION = "evaluation"
+CONCLUDED = "concluded"
+
+# order of the phases of an iteration (debugging & evaluation are alternatives)
+PHASE_ORDER = {"": 0, GENERATION: 1, EXECUTION: 2, DEBUGGING: 3, EVALUATION: 3, CONCLUDED: 4}
+
+
+@dataclass
+class Checkpoint:
+    """ Loop state of a LIFT process after its last completed phase, saved together with a snapshot (manifests in
+    the archive's blob store) of the project's tests and reports, so an interrupted run can be resumed at the next
+    phase. """
+    iteration: int = 0
+    phase: str = ""  # last completed phase of the iteration ("" - none)
+    gen_state: str = "INIT"
+    first_final: bool = True
+    passing: bool | None = None
+    tests: dict[str, str] = field(default_factory=dict)
+    reports: dict[str, str] = field(default_factory=dict)
+
+    def pending(self, phase: str) -> bool:
+        """ Returns True if the phase was not yet completed in the current iteration. """
+        return PHASE_ORDER[phase] > PHASE_ORDER[self.phase]
+
+    def save(self, paths: Paths) -> None:
+        """ Snapshots the tests & reports and atomically replaces the last checkpoint. The checkpoint is written by the
+        archive worker after the archiving jobs submitted before (a resumed run skips the completed phases, so their
+        archives have to be written), the loop does not wait for it. """
+        store = get_store(paths.archive)
+        state = asdict(self)
+
+        def job(tests: dict, reports: dict):
+            state.update(tests=store.put_staged(tests), reports=store.put_staged(reports))
+            paths.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+            tmp = paths.checkpoint.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state, indent=1))
+            os.replace(tmp, paths.checkpoint)
+            LOGGER.debug(f"Checkpoint saved (iteration {state['iteration']}, phase '{state['phase']}') at "
+                         f"{paths.checkpoint.absolute()}")
+
+        submit_archiving(job, store.stage(paths.tests), store.stage(paths.reports))
+
+    def advance(self, phase: str, paths: Paths) -> None:
+        """ Marks the phase of the current iteration as completed and saves the checkpoint. """
+        self.phase = phase
+        self.save(paths)
+
+    def next_iteration(self, paths: Paths) -> None:
+        self.iteration += 1
+        self.phase = ""
+        self.passing = None
+        self.save(paths)
+
+    @staticmethod
+    def load(paths: Paths) -> "Checkpoint | None":
+        """ Loads the last checkpoint (if available). """
+        if not paths.checkpoint.exists():
+            return None
+        return Checkpoint(**json.loads(paths.checkpoint.read_text()))
+
+    def restore(self, paths: Paths) -> None:
+        """ Replaces the project's tests & reports with the snapshot of the checkpoint (dropping partial changes of
+        an interrupted phase). """
+        store = get_store(paths.archive)
+        for dst, files in [(paths.tests, self.tests), (paths.reports, self.reports)]:
+            shutil.rmtree(dst, ignore_errors=True)
+            store.checkout(files, dst)
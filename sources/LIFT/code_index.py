@@ -0,0 +1,99 @@
+import re
+from logging import getLogger
+from pathlib import Path
+from threading import Lock
+
+LOGGER = getLogger(__name__)
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+MAX_FILE_BYTES = 1024 * 1024
+
+
+def _under(rel: str, prefix: str) -> bool:
+    """ Returns True if the relative path is the prefix path or below it (whole path segments). """
+    prefix = prefix.rstrip("/")
+    return not prefix or rel == prefix or rel.startswith(prefix + "/")
+
+
+class CodeIndex:
+    """ In-memory index of the text files under the indexed roots: the lines of every file and an inverted index
+    (identifier -> file -> line numbers) for fast identifier lookups. Updated per file by the write tools. """
+
+    def __init__(self):
+        self._project: Path | None = None
+        self._roots: list[Path] = []
+        self._lines: dict[str, list[str]] = dict()
+        self._tokens: dict[str, dict[str, list[int]]] = dict()
+        self._lock = Lock()
+
+    def build(self, project: Path, roots: list[Path]) -> None:
+        self._project, self._roots = project, roots
+        with self._lock:
+            self._lines.clear()
+            self._tokens.clear()
+        for root in roots:
+            for file in root.rglob("*"):
+                self.update(file)
+        LOGGER.info(f"Code index built: {len(self._lines)} files, {len(self._tokens)} identifiers")
+
+    def _indexed(self, path: Path) -> bool:
+        if not any(path == root or root in path.parents for root in self._roots):
+            return False
+        return not any(part == "__pycache__" or part.startswith(".") for part in path.relative_to(self._project).parts)
+
+    def _remove(self, rel: str) -> None:
+        lines = self._lines.pop(rel, None)
+        if lines is None:
+            return
+        for token in {t for line in lines for t in IDENTIFIER.findall(line)}:
+            files = self._tokens.get(token)
+            if files is not None:
+                files.pop(rel, None)
+                if not files:
+                    self._tokens.pop(token)
+
+    def update(self, path: Path) -> None:
+        """ (Re-)indexes the file or removes it (incl. all files below a deleted directory) from the index. """
+        if self._project is None or not self._indexed(path):
+            return
+
+        rel = path.relative_to(self._project).as_posix()
+        with self._lock:
+            for indexed in [r for r in self._lines if r == rel or r.startswith(rel + "/")]:
+                self._remove(indexed)
+
+            if not path.is_file() or path.stat().st_size > MAX_FILE_BYTES:
+                return
+            try:
+                lines = path.read_text(encoding="utf-8").splitlines()
+            except (UnicodeDecodeError, OSError):
+                return
+
+            self._lines[rel] = lines
+            for no, line in enumerate(lines, start=1):
+                for token in IDENTIFIER.findall(line):
+                    occurrences = self._tokens.setdefault(token, dict()).setdefault(rel, [])
+                    if not occurrences or occurrences[-1] != no:
+                        occurrences.append(no)
+
+    def search(self, query: str, regex: bool, prefix: str, context: int) -> list[dict]:
+        """ Returns the matches (path, line, snippet with context) of an identifier or a regex search. """
+        with self._lock:
+            if regex:
+                pattern = re.compile(query)
+                hits = [(rel, no) for rel, lines in self._lines.items() if _under(rel, prefix)
+                        for no, line in enumerate(lines, start=1) if pattern.search(line)]
+            else:
+                hits = [(rel, no) for rel, lines in self._tokens.get(query, dict()).items() if _under(rel, prefix)
+                        for no in lines]
+
+            matches = []
+            for rel, no in sorted(hits):
+                lines = self._lines[rel]
+                start, end = max(1, no - context), min(len(lines), no + context)
+                snippet = "\n".join(f"{i:>5}| {lines[i - 1]}" for i in range(start, end + 1))
+                matches.append({"path": rel, "line": no, "snippet": snippet})
+            return matches
+
+
+CODE_INDEX = CodeIndex()
@@ -0,0 +1,105 @@
+import json
+import posixpath
+from logging import Logger
+from typing import Any
+
+READ_TOOLS = ["read_file", "read_many"]
+WRITE_TOOLS = ["write_file", "replace_in_file", "apply_edits", "delete_path"]
+
+CHARS_PER_TOKEN = 4
+STUB_MIN_CHARS = 400
+
+
+def _size(message: Any) -> int:
+    """ Returns the (serialized) size of a message in chars. """
+    if isinstance(message, dict):
+        return len(json.dumps(message, default=str))
+    if hasattr(message, "model_dump_json"):
+        return len(message.model_dump_json())
+    return len(str(message))
+
+
+def estimate_tokens(messages: list) -> int:
+    """ Returns a rough estimate of the number of tokens of the messages. """
+    return sum(_size(m) for m in messages) // CHARS_PER_TOKEN
+
+
+def _norm(path: str) -> str:
+    return posixpath.normpath(path or ".")
+
+
+def _touched_paths(name: str, args: dict) -> list[str]:
+    if name == "read_many":
+        return [_norm(p) for p in args.get("paths") or []]
+    if name == "apply_edits":
+        return [_norm(e.get("path")) for e in args.get("edits") or []]
+    return [_norm(args.get("path"))] if "path" in args else []
+
+
+def _read_range(name: str, args: dict) -> tuple[int, int]:
+    """ Returns the byte range (start, end) a read tool call requested per file. """
+    offset = args.get("offset") or 0
+    return offset, offset + (args.get("max_bytes" if name == "read_file" else "max_bytes_per_file") or 200_000)
+
+
+def _is_output(message: Any) -> bool:
+    return isinstance(message, dict) and message.get("type") == "function_call_output"
+
+
+def _stub(name: str, paths: list[str], reason: str) -> str:
+    return json.dumps({"compacted": True, "tool": name, "paths": paths,
+                       "note": f"Output removed from the context ({reason}). Call the tool again if still needed."})
+
+
+def compact_messages(messages: list, budget: int, keep_recent: int, logger: Logger | None = None,
+                     start: int = 0) -> int:
+    """ Replaces tool outputs in the messages with short stubs (in-place) until the estimated token count is within
+    the budget. Stale outputs (reads of files written/deleted or read again later) are replaced first (oldest first),
+    then all other large outputs except the latest keep_recent ones. Outputs before start (the cached prompt prefix)
+    are only replaced if the budget cannot be met otherwise. Returns the number of replaced outputs. """
+    tokens = estimate_tokens(messages)
+    if tokens <= budget:
+        return 0
+
+    # map tool calls (name, args) to their outputs
+    calls = {m.call_id: (m.name, json.loads(m.arguments or "{}")) for m in messages
+             if getattr(m, "type", None) == "function_call" and hasattr(m, "call_id")}
+    outputs = [i for i, m in enumerate(messages) if _is_output(m) and m["call_id"] in calls
+               and len(m["output"]) > STUB_MIN_CHARS and not m["output"].startswith('{"compacted": true')]
+
+    def stale_reason(i: int) -> str | None:
+        name, args = calls[messages[i]["call_id"]]
+        if name not in READ_TOOLS:
+            return None
+        paths, (begin, end) = _touched_paths(name, args), _read_range(name, args)
+        for later in [messages[j] for j in range(i + 1, len(messages)) if _is_output(messages[j])]:
+            later_name, later_args = calls.get(later["call_id"], (None, {}))
+            later_paths = _touched_paths(later_name, later_args)
+            changed = any(p == lp or p.startswith(lp + "/") for p in paths for lp in later_paths)
+            if later_name in WRITE_TOOLS and changed:
+                return "file changed since"
+            later_begin, later_end = _read_range(later_name, later_args)
+            if later_name in READ_TOOLS and all(p in later_paths for p in paths) \
+                    and later_begin <= begin and later_end >= end:
+                return "file read again since"
+        return None
+
+    stale = [(i, reason) for i in outputs if (reason := stale_reason(i))]
+    rest = [(i, "context budget exceeded") for i in outputs[:max(len(outputs) - keep_recent, 0)]
+            if i not in dict(stale)]
+
+    replaced = 0
+    for i, reason in sorted(stale + rest, key=lambda candidate: candidate[0] < start):
+        if tokens <= budget:
+            break
+
+        name, args = calls[messages[i]["call_id"]]
+        before = _size(messages[i])
+        messages[i] = {**messages[i], "output": _stub(name, _touched_paths(name, args), reason)}
+        tokens -= (before - _size(messages[i])) // CHARS_PER_TOKEN
+        replaced += 1
+
+    if logger is not None and replaced:
+        logger.info(f"[COMPACTION] - Replaced {replaced} tool output(s), ~{tokens} tokens left (budget: {budget})")
+
+    return replaced
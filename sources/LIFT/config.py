@@ -21,6 +21,16 @@ class LiftConfig:
     put_name: str
     max_iterations: int
 
+    parallel_tools: bool
+    incremental_tests: bool
+    test_workers: int
+    warm_tests: bool
+    impact_index: bool
+
+    trials: int
+    trial_workers: int
+    provider_concurrency: dict[str, int]
+
     def __init__(self, env_file: Path):
         # load .env file is exists
         if not env_file.exists():
@@ -41,6 +51,35 @@ class LiftConfig:
         self.put_name = required_vars["LIFT_PUT"]
         self.max_iterations = int(required_vars["LIFT_MAX_ITER"])
 
+        # optional: async agent loop with parallel tool calls
+        self.parallel_tools = os.getenv("LIFT_PARALLEL_TOOLS", "false").lower() in ["1", "true", "yes"]
+
+        # optional: only execute changed test modules (merged with cached results of the unchanged ones)
+        self.incremental_tests = os.getenv("LIFT_INCREMENTAL_TESTS", "false").lower() in ["1", "true", "yes"]
+
+        # optional: number of parallel pytest workers the test suite is sharded over
+        self.test_workers = int(os.getenv("LIFT_TEST_WORKERS", 1))
+
+        # optional: execute the tests in a long-lived (warm) pytest worker instead of a new subprocess each time
+        self.warm_tests = os.getenv("LIFT_WARM_TESTS", "false").lower() in ["1", "true", "yes"]
+
+        # optional: record which test covers which PUT lines (test-impact index stored with the reports)
+        self.impact_index = os.getenv("LIFT_IMPACT_INDEX", "false").lower() in ["1", "true", "yes"]
+
+        # optional: multiple (parallel) trials
+        self.trials = int(os.getenv("LIFT_TRIALS", 1))
+        self.trial_workers = int(os.getenv("LIFT_TRIAL_WORKERS", self.trials))
+        if self.trials < 1 or self.trial_workers < 1:
+            LOGGER.error("LIFT_TRIALS and LIFT_TRIAL_WORKERS need to be at least 1!")
+            raise SetupError(f"Trials not properly set in .env file!")
+
+        # optional: max. number of concurrent requests per provider (shared by all trials)
+        self.provider_concurrency = dict()
+        for provider in ["openai", "anthropic"]:
+            limit = os.getenv(f"LIFT_{provider.upper()}_CONCURRENCY")
+            if limit is not None:
+                self.provider_concurrency[provider] = int(limit)
+
         # get models
         all_model = os.getenv("LIFT_MODEL")
         gen_model = os.getenv("LIFT_GEN_MODEL")
@@ -81,5 +120,12 @@ class LiftConfig:
             f"    ANTHROPIC_API_KEY: {(anthropic_key[:6] + '… (hidden)') if anthropic_key else "(not set)"}\n"
             f"    MODEL:             Generator -> {self.generator}, Debugger -> {self.debugger}, Evaluator -> {self.evaluator}\n"
             f"    LIFT_PUT:          {self.put_name}\n"
-            f"    LIFT_MAX_ITER:     {self.max_iterations}"
+            f"    LIFT_MAX_ITER:     {self.max_iterations}\n"
+            f"    LIFT_PARALLEL_TOOLS: {self.parallel_tools}\n"
+            f"    LIFT_INCREMENTAL_TESTS: {self.incremental_tests}\n"
+            f"    LIFT_TEST_WORKERS: {self.test_workers}\n"
+            f"    LIFT_WARM_TESTS:   {self.warm_tests}\n"
+            f"    LIFT_IMPACT_INDEX: {self.impact_index}\n"
+            f"    LIFT_TRIALS:       {self.trials} (workers: {self.trial_workers}, "
+            f"provider concurrency: {self.provider_concurrency or 'unlimited'})"
         )
@@ -0,0 +1,55 @@
+import gzip
+import json
+from logging import getLogger
+from pathlib import Path
+from time import time
+from typing import Any
+
+LOGGER = getLogger(__name__)
+
+
+def _serialize(message: Any) -> dict:
+    """ Returns a json-serializable dict of a message (input dicts or response items of the openai types). """
+    if isinstance(message, dict):
+        return message
+    if hasattr(message, "model_dump"):
+        return message.model_dump(mode="json", exclude_none=True)
+    return {"type": type(message).__name__, "repr": repr(message)}
+
+
+class ConversationLog:
+    """ Append-only conversation log of an agent as gzip-compressed JSON lines (one record per message). Every
+    append is written as a separate gzip member, so the file stays readable (by any gzip reader) if the process
+    crashes mid-conversation. A sidecar index (one json line per member: first seq, record count, byte offset and
+    length) allows random access to a record by decompressing only its member. """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path.with_suffix(".idx")
+        self._seq = 0
+
+        # a re-run (e.g. resumed phase) replaces the log of the interrupted run
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        self.index_path.unlink(missing_ok=True)
+
+    def append(self, records: list[dict]) -> None:
+        """ Appends the records (as one gzip member) and indexes them. """
+        if not records:
+            return
+
+        lines = []
+        for record in records:
+            lines.append(json.dumps({"seq": self._seq, "ts": round(time(), 3), **record}, default=str))
+            self._seq += 1
+        member = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+        with open(self.path, "ab") as file:
+            offset = file.tell()
+            file.write(member)
+        with open(self.index_path, "a") as index:
+            index.write(json.dumps({"seq": self._seq - len(records), "count": len(records), "offset": offset,
+                                    "length": len(member)}) + "\n")
+
+    def append_messages(self, messages: list) -> None:
+        self.append([{"kind": "message", "message": _serialize(m)} for m in messages])
@@ -0,0 +1,152 @@
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+def _bits(bitmap: int) -> list[int]:
+    """ Returns the positions (line numbers) of the set bits of a bitmap. """
+    lines = []
+    while bitmap:
+        low = bitmap & -bitmap
+        lines.append(low.bit_length() - 1)
+        bitmap ^= low
+    return lines
+
+
+def _ranges(lines: list[int], executable: list[int]) -> list[str]:
+    """ Compresses lines into ranges ('4', '8-12'); lines are consecutive if no executable line lies between them. """
+    index = {line: i for i, line in enumerate(executable)}
+    ranges, start, prev = [], None, None
+    for line in lines:
+        if start is not None and index[line] == index[prev] + 1:
+            prev = line
+            continue
+        if start is not None:
+            ranges.append(f"{start}" if start == prev else f"{start}-{prev}")
+        start = prev = line
+    if start is not None:
+        ranges.append(f"{start}" if start == prev else f"{start}-{prev}")
+    return ranges
+
+
+def _rate(covered: int, valid: int) -> float:
+    return round(covered / valid, 4) if valid else 1.0
+
+
+@dataclass(slots=True)
+class FileCoverage:
+    lines: int = 0  # bitmap of the executable lines
+    covered: int = 0  # bitmap of the covered lines
+    branches: dict[int, tuple[int, int, str]] = field(default_factory=dict)  # line -> (covered, total, missing)
+
+    @property
+    def line_rate(self) -> float:
+        return _rate(self.covered.bit_count(), self.lines.bit_count())
+
+    @property
+    def branch_rate(self) -> float:
+        return _rate(sum(b[0] for b in self.branches.values()), sum(b[1] for b in self.branches.values()))
+
+    def uncovered_ranges(self) -> list[str]:
+        return _ranges(_bits(self.lines & ~self.covered), _bits(self.lines))
+
+    def partial_branches(self) -> list[dict]:
+        return [dict(line=line, covered=covered, total=total, missing=missing)
+                for line, (covered, total, missing) in sorted(self.branches.items()) if covered < total]
+
+    def summary(self) -> dict:
+        return dict(line_rate=self.line_rate, branch_rate=self.branch_rate,
+                    uncovered_lines=(self.lines & ~self.covered).bit_count(),
+                    partial_branches=len(self.partial_branches()))
+
+
+@dataclass(slots=True)
+class CoverageReport:
+    line_rate: float
+    branch_rate: float
+    files: dict[str, FileCoverage]  # path (relative to the project) -> coverage
+
+    @staticmethod
+    def parse(report_file: Path, project: Path) -> "CoverageReport":
+        """ Parses a cobertura coverage report (streaming) into per-file line & branch bitmaps. The file names are
+        resolved against the report sources and made relative to the project. """
+        root, sources, files, current = None, [], dict(), None
+        for event, elem in ET.iterparse(report_file, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                elif elem.tag == "class":
+                    path = Path(elem.get("filename"))
+                    if not path.is_absolute() and sources:
+                        path = Path(sources[0]) / path
+                    rel = path.relative_to(project).as_posix() if project in path.parents else path.as_posix()
+                    current = files.setdefault(rel, FileCoverage())
+                continue
+
+            if elem.tag == "source":
+                sources.append(elem.text.strip())
+            elif elem.tag == "line" and current is not None:
+                number = int(elem.get("number"))
+                current.lines |= 1 << number
+                if int(elem.get("hits")) > 0:
+                    current.covered |= 1 << number
+                if elem.get("branch") == "true":
+                    # e.g. condition-coverage="50% (1/2)"
+                    covered, total = elem.get("condition-coverage").rsplit("(", 1)[1].rstrip(")").split("/")
+                    current.branches[number] = (int(covered), int(total), elem.get("missing-branches", ""))
+                elem.clear()
+            elif elem.tag == "class":
+                current = None
+                elem.clear()
+
+        return CoverageReport(line_rate=float(root.get("line-rate")), branch_rate=float(root.get("branch-rate")),
+                              files=files)
+
+    def diff(self, previous: "CoverageReport | None") -> dict:
+        """ Returns the coverage changes since the previous report (rate deltas, newly covered/uncovered lines). """
+        before = previous.files if previous is not None else dict()
+        files = dict()
+        for path in sorted(self.files.keys() | before.keys()):
+            cur, prev = self.files.get(path, FileCoverage()), before.get(path, FileCoverage())
+            gained, lost = cur.covered & ~prev.covered, prev.covered & ~cur.covered
+            # modules new to the report start at 0%
+            prev_line, prev_branch = (prev.line_rate, prev.branch_rate) if path in before else (0.0, 0.0)
+            branch_delta = round(cur.branch_rate - prev_branch, 4)
+            if gained or lost or branch_delta:
+                executable = _bits(cur.lines | prev.lines)
+                files[path] = dict(line_rate=cur.line_rate, line_rate_delta=round(cur.line_rate - prev_line, 4),
+                                   branch_rate=cur.branch_rate, branch_rate_delta=branch_delta,
+                                   newly_covered=_ranges(_bits(gained), executable),
+                                   newly_uncovered=_ranges(_bits(lost), executable))
+
+        return dict(line_rate=self.line_rate,
+                    line_rate_delta=round(self.line_rate - (previous.line_rate if previous else 0.0), 4),
+                    branch_rate=self.branch_rate,
+                    branch_rate_delta=round(self.branch_rate - (previous.branch_rate if previous else 0.0), 4),
+                    files=files)
+
+
+_COVERAGE: CoverageReport | None = None
+_PREVIOUS: CoverageReport | None = None
+
+
+def parse_cur_cov_report(report_file: Path, project: Path) -> CoverageReport | None:
+    """ Parses the last coverage report (xml) generated by pytest-cov (if available) and keeps the previous one for
+    the coverage delta. Returns the parsed report or None (if not available). """
+    global _COVERAGE, _PREVIOUS
+
+    if not report_file.exists():
+        return None
+
+    _PREVIOUS, _COVERAGE = _COVERAGE, CoverageReport.parse(report_file, project.resolve())
+    return _COVERAGE
+
+
+def get_current_coverage() -> CoverageReport | None:
+    """ Returns the last parsed coverage report (if available else None). """
+    return _COVERAGE
+
+
+def get_coverage_delta() -> dict | None:
+    """ Returns the coverage changes between the last two executions (if available else None). """
+    return _COVERAGE.diff(_PREVIOUS) if _COVERAGE is not None else None
@@ -0,0 +1,409 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from logging import getLogger
+from pathlib import Path
+
+from coverage import Coverage, CoverageData
+from coverage.exceptions import NoDataError
+from pytest_html_report import config as html_report_config
+from pytest_html_report.report_generator import generate_html_from_json, process_test_data
+
+from .impact import select_impacted_tests, update_impact_index
+from .paths import Paths
+from .pytest_worker import run_in_worker
+
+LOGGER = getLogger(__name__)
+
+TEST_MODULE_PATTERN = re.compile(r"^(test_.*|.*_test)\.py$")
+HTML_CHECKPOINT_PATTERN = "*_checkpoint_*.json"  # test cases of a pytest-html-report run
+
+
+def hash_tree(root: Path) -> dict[str, str]:
+    """ Returns the content hashes (sha256) of all files under root (relative posix path -> hash), ignoring caches. """
+    hashes = dict()
+    if not root.exists():
+        return hashes
+
+    for file in sorted(root.rglob("*")):
+        rel = file.relative_to(root)
+        if not file.is_file() or any(part == "__pycache__" or part.startswith(".") for part in rel.parts):
+            continue
+        hashes[rel.as_posix()] = hashlib.sha256(file.read_bytes()).hexdigest()
+
+    return hashes
+
+
+def is_test_module(rel: str) -> bool:
+    return TEST_MODULE_PATTERN.match(rel.split("/")[-1]) is not None
+
+
+def pytest_command(put_name: str, paths: Paths, targets: list[Path], exec_report: Path,
+                   cov_report: Path | None, contexts: bool = False, cache_dir: Path | None = None) -> list:
+    """ Builds the pytest command executing the targets with JUnit and (branch) coverage reporting. A separate
+    cache_dir keeps parallel runs from sharing the project's .pytest_cache. """
+    return [sys.executable, "-m", "pytest", *[t.absolute() for t in targets],
+            f"--rootdir={paths.project.absolute()}",
+            *(["-o", f"cache_dir={cache_dir.absolute()}"] if cache_dir else []),
+            f"--cache-clear", f"--disable-warnings",
+            f"--junit-xml={exec_report.absolute()}",
+            f"--cov={put_name}", f"--cov-branch",
+            *([f"--cov-context=test"] if contexts else []),
+            f"--cov-report=xml:{cov_report.absolute()}" if cov_report else f"--cov-report="]
+
+
+def run_command(cmd: list, cwd: Path, env: dict[str, str] | None = None) -> int:
+    """ Runs a pytest command in cwd in the warm pytest worker (if enabled) or as cold subprocess (fallback). Returns
+    the pytest exit code. """
+    env = env or dict()
+    code = run_in_worker(cmd, cwd, env)
+    if code is None:
+        code = subprocess.run(cmd, cwd=cwd, env={**os.environ, **env}).returncode
+    return code
+
+
+def case_module(case: ET.Element) -> str:
+    """ Returns the dotted module path of a JUnit testcase (collection errors only carry it as name). """
+    return case.get("classname") or case.get("name")
+
+
+def belongs_to(case: ET.Element, rel: str) -> bool:
+    """ Returns True if the JUnit testcase originates from the test module at rel (relative to the project). """
+    dotted, module = rel.removesuffix(".py").replace("/", "."), case_module(case)
+    return module == dotted or module.startswith(dotted + ".")
+
+
+def merge_junit_reports(cached: Path | None, new: list[Path], replaced: list[str], out: Path) -> None:
+    """ Merges the testcases of the cached and the new JUnit reports into a single report. Cached testcases of the
+    replaced test modules are dropped. The testsuite totals are recalculated. """
+    cases = []
+    if cached is not None and cached.exists():
+        cases.extend(c for c in ET.parse(cached).getroot().iter("testcase")
+                     if not any(belongs_to(c, rel) for rel in replaced))
+
+    suite_attrs = dict(name="pytest")
+    for report in [r for r in new if r.exists()]:
+        new_suite = ET.parse(report).getroot().find("testsuite")
+        suite_attrs.update({k: v for k, v in new_suite.attrib.items() if k in ["name", "timestamp", "hostname"]})
+        cases.extend(new_suite.iter("testcase"))
+
+    suite_attrs.update(
+        errors=str(sum(c.find("error") is not None for c in cases)),
+        failures=str(sum(c.find("failure") is not None for c in cases)),
+        skipped=str(sum(c.find("skipped") is not None for c in cases)),
+        tests=str(len(cases)),
+        time=f"{sum(float(c.get('time', 0)) for c in cases):.3f}",
+    )
+
+    root = ET.Element("testsuites")
+    suite = ET.SubElement(root, "testsuite", suite_attrs)
+    suite.extend(sorted(cases, key=lambda c: (case_module(c), c.get("name"))))
+    ET.ElementTree(root).write(out, encoding="utf-8", xml_declaration=True)
+
+
+def collect_run_data(run_data: Path) -> bool:
+    """ Combines suffixed data files (left behind by pytest-cov, or the import-time coverage of the warm worker) into
+    run_data and deletes them. Returns True if coverage data exists. """
+    suffixed = sorted(run_data.parent.glob(run_data.name + ".*"))
+    if suffixed:
+        data = CoverageData(basename=str(run_data))
+        data.read()
+        for file in suffixed:
+            part = CoverageData(basename=str(file))
+            part.read()
+            data.update(part)
+            file.unlink()
+        data.write()
+
+    return run_data.exists()
+
+
+def split_coverage(run_data: Path, modules: list[str], parts: Path, keep_base: bool = False) -> None:
+    """ Splits the coverage data of a run (recorded with test contexts) into one data file per test module and one
+    for the context-free (import-time) coverage. If keep_base, the import-time coverage is added to the existing one
+    (dropping files that no longer exist; it is rebuilt by the next full run). """
+    data = CoverageData(basename=str(run_data))
+    data.read()
+
+    def measured_of(source: CoverageData) -> dict[str, list]:
+        measured = {f: (source.arcs(f) if source.has_arcs() else source.lines(f)) for f in source.measured_files()}
+        return {f: m for f, m in measured.items() if m and Path(f).exists()}
+
+    def write_part(name: str, contexts: list[str], keep: bool = False) -> None:
+        data.set_query_contexts(contexts)
+        part_file = parts / (name.replace("/", "__") + ".coverage")
+        measured = measured_of(data)
+        if keep and part_file.exists():
+            old = CoverageData(basename=str(part_file))
+            old.read()
+            for f, m in measured_of(old).items():
+                measured[f] = sorted(set(measured.get(f, [])) | set(m))
+        part_file.unlink(missing_ok=True)
+
+        if not measured:
+            return
+
+        part = CoverageData(basename=str(part_file))
+        part.add_arcs(measured) if data.has_arcs() else part.add_lines(measured)
+        part.write()
+
+    parts.mkdir(parents=True, exist_ok=True)
+    write_part("_base_", [r"^$"], keep_base)
+    for rel in modules:
+        write_part(rel, [r"^" + re.escape(rel) + r"::"])
+
+
+def combine_data(parts: list[Path], combined: Path) -> None:
+    """ Combines the coverage data files into a single data file. """
+    data = CoverageData(basename=str(combined))
+    data.erase()
+    for part_file in parts:
+        part = CoverageData(basename=str(part_file))
+        part.read()
+        data.update(part)
+    data.write()
+
+
+def write_coverage_report(data_file: Path, put: Path, out: Path) -> None:
+    """ Writes the cobertura xml report (like pytest-cov) for the coverage data file. """
+    cov = Coverage(data_file=str(data_file), source=[str(put)], branch=True, config_file=False)
+    cov.load()
+    try:
+        cov.xml_report(outfile=str(out))
+    except NoDataError:
+        LOGGER.warning(f"No coverage data collected, no coverage report written to {out.absolute()}")
+
+
+def find_test_modules(target: Path) -> list[Path]:
+    """ Returns the test modules of a target (a test module itself or a directory containing test modules). A pytest
+    node id (tests/test_a.py::test_f) is returned as is. """
+    if not target.is_dir():
+        return [target]
+    return [file for file in sorted(target.rglob("*.py")) if is_test_module(file.name)
+            and not any(part == "__pycache__" or part.startswith(".") for part in file.relative_to(target).parts)]
+
+
+def module_of(target: Path) -> Path:
+    """ Returns the test module of a target (the module part of a pytest node id). """
+    return Path(str(target).split("::")[0])
+
+
+def make_shards(modules: list[Path], workers: int) -> list[list[Path]]:
+    """ Distributes the test modules over (at most) workers shards, balanced by file size. """
+    shards = [[] for _ in range(min(workers, len(modules)))]
+    loads = [0] * len(shards)
+    for module in sorted(modules, key=lambda m: m.stat().st_size, reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(module)
+        loads[i] += module.stat().st_size
+    return shards
+
+
+def write_html_report_config(paths: Paths, cwd: Path) -> None:
+    """ Writes the pytest-html-report config for a run in cwd, with its report dir redirected to cwd (so parallel
+    runs do not overwrite each other's report files). """
+    with open(paths.config / "pytest_html_report.yml") as file:
+        lines = file.readlines()
+
+    new_lines = [f"  report_dir: \"{cwd.absolute()}\"\n" if line.strip().startswith("report_dir:") else line
+                 for line in lines]
+    (cwd / "config").mkdir(parents=True, exist_ok=True)
+    with open(cwd / "config" / "pytest_html_report.yml", "w") as file:
+        file.writelines(new_lines)
+
+
+def read_html_cases(*report_dirs: Path) -> list[dict]:
+    """ Returns the test cases of the pytest-html-report runs (checkpoint files) in the report dirs. """
+    return [case for report_dir in report_dirs for file in sorted(report_dir.glob(HTML_CHECKPOINT_PATTERN))
+            for case in json.loads(file.read_text())["testsuites"][0]["cases"]]
+
+
+def write_html_report(paths: Paths, cases: list[dict], report_dir: Path) -> None:
+    """ Writes the pytest-html-report (and its checkpoint file) of the test cases, e.g. merged from several runs, to
+    report_dir, replacing the report of the last run. """
+    # the plugin looks up its config from the cwd, use the one of the trial
+    html_report_config.find_config_file = lambda: str(paths.config / "pytest_html_report.yml")
+    html_report_config.load_config()
+
+    for file in [*report_dir.glob("report_*.html"), *report_dir.glob(HTML_CHECKPOINT_PATTERN)]:
+        file.unlink()
+    data = {**process_test_data(sorted(cases, key=lambda c: (c["classname"], c["name"]))), "test_status": "complete"}
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    (report_dir / f"{data['test_environment']}_checkpoint_{timestamp}.json").write_text(json.dumps(data, indent=2))
+    generate_html_from_json(data, str(report_dir / f"report_{timestamp}.html"))
+
+
+def combine_returncodes(codes: list[int]) -> int:
+    """ Combines the pytest exit codes of the shards (5 - no tests collected - only if no shard collected any). """
+    for code in [2, 3, 4, 1]:
+        if code in codes:
+            return code
+    return 5 if codes and all(code == 5 for code in codes) else 0
+
+
+def run_pytest(put_name: str, paths: Paths, targets: list[Path], exec_report: Path, cov_data: Path,
+               workers: int = 1, contexts: bool = False) -> int:
+    """ Runs pytest on the targets (sharded over up to workers parallel processes) writing a single JUnit report, a
+    single coverage data file and a single pytest-html-report (to the reports dir). Returns the (combined) pytest exit
+    code. """
+    [file.unlink() for file in cov_data.parent.glob(cov_data.name + "*")]
+    exec_report.unlink(missing_ok=True)
+
+    # node ids are sharded by their module (all node ids of a module run in the same shard)
+    targets_of: dict[Path, list[Path]] = dict()
+    for target in [m for t in targets for m in find_test_modules(t)]:
+        targets_of.setdefault(module_of(target), []).append(target)
+    shards = make_shards(list(targets_of), workers) if workers > 1 else []
+    shards = [[target for module in shard for target in targets_of[module]] for shard in shards]
+    if len(shards) <= 1:
+        code = run_command(pytest_command(put_name, paths, targets, exec_report, None, contexts), paths.workspace,
+                           {"COVERAGE_FILE": str(cov_data)})
+        collect_run_data(cov_data)
+        return code
+
+    shard_dir = cov_data.parent / "shards"
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shard_dir.mkdir(parents=True)
+    LOGGER.info(f"Executing {len(targets_of)} test module(s) on {len(shards)} workers")
+
+    # the shards run in their own dir (the pytest-html-report config is looked up from the cwd) and keep the
+    # import path of the trial's workspace
+    python_path = os.pathsep.join([str(paths.workspace), *filter(None, [os.environ.get("PYTHONPATH")])])
+    procs = []
+    for i, shard in enumerate(shards):
+        shard_cwd = shard_dir / f"shard_{i:02d}"
+        write_html_report_config(paths, shard_cwd)
+        with open(shard_dir / f"output_{i:02d}.txt", "w") as output:
+            procs.append(subprocess.Popen(
+                pytest_command(put_name, paths, shard, shard_dir / f"report_{i:02d}.xml", None, contexts,
+                               cache_dir=shard_cwd / ".pytest_cache"),
+                env={**os.environ, "COVERAGE_FILE": str(shard_dir / f"shard_{i:02d}.coverage"),
+                     "PYTHONPATH": python_path},
+                cwd=shard_cwd, stdout=output, stderr=subprocess.STDOUT))
+    codes = [proc.wait() for proc in procs]
+    LOGGER.info(f"Workers finished with exit codes {codes} (output in {shard_dir.absolute()})")
+
+    merge_junit_reports(None, sorted(shard_dir.glob("report_*.xml")), [], exec_report)
+    write_html_report(paths, read_html_cases(*[shard_dir / f"shard_{i:02d}" for i in range(len(shards))]),
+                      paths.reports)
+    shard_data = [shard_dir / f"shard_{i:02d}.coverage" for i in range(len(shards))]
+    combine_data([d for d in shard_data if collect_run_data(d)], cov_data)
+    return combine_returncodes(codes)
+
+
+def execute_tests_parallel(put_name: str, paths: Paths, workers: int, impact_index: Path | None = None) -> bool:
+    """ Executes the test suite sharded over workers parallel pytest processes (a single one if workers is 1) and
+    writes the combined reports. If an impact index is given, the tests are executed with coverage contexts and the
+    index is rebuilt. Returns True if all tests passed. """
+    cache = paths.cache / "parallel"
+    cache.mkdir(parents=True, exist_ok=True)
+    paths.reports.mkdir(exist_ok=True)
+
+    returncode = run_pytest(put_name, paths, [paths.project], paths.reports / "execution-report.xml",
+                            cache / "run.coverage", workers, contexts=impact_index is not None)
+    if impact_index is not None:
+        update_impact_index(impact_index, cache / "run.coverage", paths.project, paths.put)
+    write_coverage_report(cache / "run.coverage", paths.put, paths.reports / "coverage-report.xml")
+    return returncode == 0
+
+
+def execute_tests_impacted(put_name: str, paths: Paths, impact_index: Path, workers: int = 1) -> bool:
+    """ Executes only the tests whose covered lines (recorded in the impact index of a previous PUT version) were
+    changed in the current PUT (all tests if lines executed at import time changed). Returns True if all executed
+    tests passed (or none was impacted). """
+    cache = paths.cache / "impact"
+    cache.mkdir(parents=True, exist_ok=True)
+    paths.reports.mkdir(exist_ok=True)
+
+    selected = select_impacted_tests(json.loads(impact_index.read_text()), paths.project)
+    if selected is None:
+        LOGGER.info("Impacted execution: import-time code changed, executing all tests")
+        targets = [paths.project]
+    elif not selected:
+        LOGGER.info("Impacted execution: no test covers a changed line of the PUT (empty execution report written)")
+        merge_junit_reports(None, [], [], paths.reports / "execution-report.xml")
+        return True
+    else:
+        LOGGER.info(f"Impacted execution: {len(selected)} test(s) cover changed lines of the PUT")
+        targets = [paths.project / test for test in selected]
+
+    returncode = run_pytest(put_name, paths, targets, paths.reports / "execution-report.xml", cache / "run.coverage",
+                            workers)
+    write_coverage_report(cache / "run.coverage", paths.put, paths.reports / "coverage-report.xml")
+    return returncode == 0
+
+
+def execute_tests_incremental(put_name: str, paths: Paths, workers: int = 1, impact_index: Path | None = None) -> bool:
+    """ Executes only the test modules that changed since the last execution (based on content hashes) and merges
+    their results (JUnit, coverage & html report) with the cached results of the unchanged modules. Falls back to a
+    full execution if anything but test modules changed. If an impact index is given, it is updated with the executed
+    tests. Returns True if all tests passed. """
+    cache = paths.cache / "incremental"
+    state_file, parts = cache / "state.json", cache / "coverage"
+    cached_exec, run_exec, run_cov = cache / "execution-report.xml", cache / "run-report.xml", cache / "run.coverage"
+    cached_html = cache / "html-cases.json"
+    exec_report, cov_report = paths.reports / "execution-report.xml", paths.reports / "coverage-report.xml"
+
+    state = json.loads(state_file.read_text()) if state_file.exists() else None
+    tests, put = hash_tree(paths.tests), hash_tree(paths.put)
+
+    prefix = paths.tests.relative_to(paths.project).as_posix()
+    old_tests = state["tests"] if state else dict()
+    changed = [rel for rel, sha in tests.items() if old_tests.get(rel) != sha]
+    deleted = [rel for rel in old_tests if rel not in tests]
+    full = state is None or state["put"] != put or not all(is_test_module(rel) for rel in changed + deleted)
+
+    if full:
+        LOGGER.info("Incremental execution: full run (no cache, PUT or non-test module changed)")
+        targets = [paths.project]
+        modules = [rel for rel in tests if is_test_module(rel)]
+        replaced = None
+    else:
+        LOGGER.info(f"Incremental execution: {len(changed)} changed, {len(deleted)} deleted test module(s)")
+        targets = [paths.tests / rel for rel in changed]
+        modules = changed
+        replaced = [f"{prefix}/{rel}" for rel in changed + deleted]
+
+    cache.mkdir(parents=True, exist_ok=True)
+    paths.reports.mkdir(exist_ok=True)
+    run_exec.unlink(missing_ok=True)
+    returncode = 0
+
+    if targets:
+        returncode = run_pytest(put_name, paths, targets, run_exec, run_cov, workers, contexts=True)
+
+        if full:
+            for part in parts.glob("*.coverage"):
+                part.unlink()
+        if run_cov.exists():
+            split_coverage(run_cov, [f"{prefix}/{rel}" for rel in modules], parts, keep_base=not full)
+
+    for rel in deleted:
+        (parts / (f"{prefix}/{rel}".replace("/", "__") + ".coverage")).unlink(missing_ok=True)
+    if impact_index is not None and (targets or deleted):
+        update_impact_index(impact_index, run_cov if targets else None, paths.project, paths.put, replaced)
+
+    # merge reports & write them to the reports dir
+    merge_junit_reports(None if full else cached_exec, [run_exec], replaced or [], cached_exec)
+    exec_report.write_bytes(cached_exec.read_bytes())
+    replaced_modules = {rel.removesuffix(".py").replace("/", ".") for rel in replaced or []}
+    cases = [] if full or not cached_html.exists() else \
+        [c for c in json.loads(cached_html.read_text()) if c["classname"] not in replaced_modules]
+    cases += read_html_cases(paths.reports) if targets else []
+    cached_html.write_text(json.dumps(cases))
+    write_html_report(paths, cases, paths.reports)
+    combine_data(sorted(parts.glob("*.coverage")), cache / "combined.coverage")
+    write_coverage_report(cache / "combined.coverage", paths.put, cov_report)
+
+    suite = ET.parse(cached_exec).getroot().find("testsuite")
+    passing = returncode not in [2, 3, 4] and int(suite.get("tests")) > 0 and \
+        int(suite.get("errors")) == 0 and int(suite.get("failures")) == 0
+
+    state_file.write_text(json.dumps({"tests": tests, "put": put}))
+    return passing
@@ -0,0 +1,66 @@
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_FILE_BYTES = 1024 * 1024
+
+
+class FileCache:
+    """ LRU cache of file contents keyed by path, mtime & size (so changed files are never served from the cache). """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._entries: OrderedDict[Path, tuple[int, int, bytes]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, path: Path, stat: os.stat_result) -> bytes:
+        """ Returns the content of the file (read & cached on a miss, larger files than CACHE_MAX_FILE_BYTES are
+        not cached). """
+        if stat.st_size > CACHE_MAX_FILE_BYTES:
+            return path.read_bytes()
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                self._entries.move_to_end(path)
+                return entry[2]
+
+        raw = path.read_bytes()
+
+        with self._lock:
+            self._pop(path)
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, raw)
+            self._size += len(raw)
+            while self._size > self._max_bytes and self._entries:
+                self._pop(next(iter(self._entries)))
+
+        return raw
+
+    def _pop(self, path: Path) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._size -= len(entry[2])
+
+    def invalidate(self, path: Path) -> None:
+        """ Removes the file (or all files under the directory) from the cache. """
+        with self._lock:
+            for cached in [p for p in self._entries if p == path or path in p.parents]:
+                self._pop(cached)
+
+
+FILE_CACHE = FileCache()
+
+
+def read_window(path: Path, offset: int, max_bytes: int) -> tuple[bytes, int]:
+    """ Reads up to max_bytes starting at offset from the file. Small files are served from the cache, windows of
+    large files are read using seek (only touching the requested bytes). Returns the window and the file size. """
+    stat = path.stat()
+    if stat.st_size <= CACHE_MAX_FILE_BYTES:
+        return FILE_CACHE.get(path, stat)[offset:offset + max_bytes], stat.st_size
+
+    with open(path, "rb") as file:
+        file.seek(offset)
+        return file.read(max_bytes), stat.st_size
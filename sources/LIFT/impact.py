@@ -0,0 +1,92 @@
+import hashlib
+import json
+from difflib import SequenceMatcher
+from logging import getLogger
+from pathlib import Path
+
+from coverage import CoverageData
+
+LOGGER = getLogger(__name__)
+
+IMPACT_INDEX_NAME = "impact-index.json"
+IMPORT_CONTEXT = ""  # coverage recorded outside of any test (e.g. module-level code executed at import)
+
+
+def line_hashes(file: Path) -> list[str]:
+    """ Returns short content hashes of the lines of a file (used to diff it against a later version). """
+    lines = file.read_text(encoding="utf-8", errors="replace").splitlines()
+    return [hashlib.blake2b(line.encode(), digest_size=6).hexdigest() for line in lines]
+
+
+def _test_id(context: str) -> str:
+    """ Returns the test node id of a pytest-cov test context (e.g. 'tests/test_a.py::test_f|run'). """
+    return context.rsplit("|", 1)[0] if "|" in context else context
+
+
+def update_impact_index(index_file: Path, cov_data: Path | None, project: Path, put: Path,
+                        replaced: list[str] | None = None) -> None:
+    """ Updates the test-impact index (test node id -> PUT file -> covered lines, plus the line hashes of the PUT)
+    from coverage data recorded with test contexts. If replaced is None, the index is rebuilt from the data; else
+    the tests of the replaced test modules are dropped and the tests of the data are added. """
+    index = json.loads(index_file.read_text()) if replaced is not None and index_file.exists() else None
+    tests: dict[str, dict[str, set[int]]] = dict()
+    if index is not None:
+        tests = {test: {rel: set(lines) for rel, lines in files.items()} for test, files in index["tests"].items()
+                 if not any(test.startswith(rel + "::") for rel in replaced)}
+
+    if cov_data is not None and cov_data.exists():
+        data = CoverageData(basename=str(cov_data))
+        data.read()
+        for file in [Path(f) for f in data.measured_files() if put in Path(f).parents]:
+            rel = file.relative_to(project).as_posix()
+            for line, contexts in data.contexts_by_lineno(str(file)).items():
+                for context in contexts:
+                    tests.setdefault(_test_id(context), dict()).setdefault(rel, set()).add(line)
+
+    put_lines = index["put"] if index is not None else {f.relative_to(project).as_posix(): line_hashes(f)
+                                                        for f in sorted(put.rglob("*.py"))}
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    index_file.write_text(json.dumps(dict(put=put_lines, tests={
+        test: {rel: sorted(lines) for rel, lines in files.items()} for test, files in sorted(tests.items())})))
+
+
+def changed_lines(index: dict, project: Path) -> dict[str, tuple[set[int], list[tuple[int, ...]]]]:
+    """ Returns per PUT file the lines (of the indexed PUT version) changed or deleted in the current PUT version and
+    the insertions (as the surrounding lines of the indexed version). """
+    changed = dict()
+    for rel, old in index["put"].items():
+        file = project / rel
+        new = line_hashes(file) if file.exists() else []
+        if new == old:
+            continue
+
+        lines, insertions = set(), []
+        for tag, i1, i2, _, _ in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag == "insert":
+                insertions.append(tuple(line for line in (i1, i1 + 1) if 1 <= line <= len(old)))
+            elif tag != "equal":
+                lines.update(range(i1 + 1, i2 + 1))
+        changed[rel] = (lines, insertions)
+    return changed
+
+
+def select_impacted_tests(index: dict, project: Path) -> list[str] | None:
+    """ Returns the node ids of the tests covering changed lines of the PUT (or lines around an insertion) or None if
+    all tests are impacted: changed lines executed at import time (e.g. signatures, module-level code) or insertions
+    only surrounded by such lines. """
+    tests = {test: {rel: set(lines) for rel, lines in files.items()} for test, files in index["tests"].items()}
+    imports = tests.pop(IMPORT_CONTEXT, dict())
+
+    selected = set()
+    for rel, (lines, insertions) in changed_lines(index, project).items():
+        if imports.get(rel, set()) & lines:
+            return None
+        selected.update(test for test, files in tests.items() if files.get(rel, set()) & lines)
+
+        for around in insertions:
+            hits = {test for test, files in tests.items() if files.get(rel, set()).intersection(around)}
+            if not hits and imports.get(rel, set()).intersection(around):
+                return None
+            selected.update(hits)
+
+    return sorted(selected)
@@ -0,0 +1,150 @@
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+
+LOGGER = getLogger(__name__)
+
+
+@dataclass
+class CallMetrics:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    reasoning_tokens: int = 0
+    latency: float = 0.0
+    retry_wait: float = 0.0
+    retries: int = 0
+
+    @staticmethod
+    def from_usage(usage, latency: float = 0.0, retry_wait: float = 0.0, retries: int = 0) -> "CallMetrics":
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+        return CallMetrics(
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+            cached_tokens=getattr(input_details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens",
+                                                                                  0) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            reasoning_tokens=getattr(output_details, "reasoning_tokens", 0) or 0,
+            latency=latency, retry_wait=retry_wait, retries=retries,
+        )
+
+
+def _sum_calls(calls: list[dict]) -> dict:
+    totals = {f.name: 0 for f in fields(CallMetrics)}
+    for call in calls:
+        for key in totals:
+            totals[key] += call.get(key, 0)
+    totals["calls"] = len(calls)
+    return totals
+
+
+def _sum_tools(tools: list[dict]) -> dict:
+    totals = dict()
+    for tool in tools:
+        for name, stats in tool.items():
+            total = totals.setdefault(name, dict(calls=0, errors=0, time=0.0))
+            for key in total:
+                total[key] += stats[key]
+    return totals
+
+
+class AgentMetrics:
+    """ Metrics of all model calls and tool executions of a single agent. """
+
+    def __init__(self):
+        self.calls: list[CallMetrics] = []
+        self.tools: dict[str, dict] = dict()
+
+    def add_call(self, call: CallMetrics) -> None:
+        self.calls.append(call)
+
+    def add_tool(self, name: str, duration: float, error: bool) -> None:
+        stats = self.tools.setdefault(name, dict(calls=0, errors=0, time=0.0))
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["time"] += duration
+
+    def to_dict(self) -> dict:
+        calls = [asdict(call) for call in self.calls]
+        return dict(totals=_sum_calls(calls), tools=self.tools, calls=calls)
+
+
+class MetricsRecorder:
+    """ Collects the agent metrics and phase durations per iteration and writes them to a json file (after every
+    recorded agent/phase, so the file is up-to-date if the trial crashes). """
+
+    def __init__(self, out: Path, trial: int | None = None):
+        self._out = out
+        self._trial = trial
+        self._iterations: dict[int, dict] = dict()
+
+    def load(self) -> None:
+        """ Restores the recorded iterations from the json file (e.g. when resuming an interrupted run). """
+        if not self._out.exists():
+            return
+        data = json.loads(self._out.read_text())
+        self._iterations = {int(it): dict(phases=d["phases"], agents=d["agents"])
+                            for it, d in data["iterations"].items()}
+
+    def _iteration(self, iteration: int) -> dict:
+        return self._iterations.setdefault(iteration, dict(phases=dict(), agents=dict()))
+
+    @contextmanager
+    def phase(self, iteration: int, name: str):
+        """ Measures the wall-clock time of a phase (e.g. generation, execution, ...) of an iteration. """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            phases = self._iteration(iteration)["phases"]
+            phases[name] = phases.get(name, 0.0) + perf_counter() - start
+            self.write()
+
+    def record_agent(self, iteration: int, agent) -> None:
+        self._iteration(iteration)["agents"][agent.type_.lower()] = agent.metrics.to_dict()
+        self.write()
+
+    def to_dict(self) -> dict:
+        iterations, calls, tools, phases = dict(), [], [], dict()
+        for iteration, data in sorted(self._iterations.items()):
+            agents = data["agents"]
+            iter_calls = [c for agent in agents.values() for c in agent["calls"]]
+            iterations[f"{iteration:02d}"] = dict(totals=_sum_calls(iter_calls), phases=data["phases"], agents=agents)
+
+            calls.extend(iter_calls)
+            tools.extend(agent["tools"] for agent in agents.values())
+            for name, duration in data["phases"].items():
+                phases[name] = phases.get(name, 0.0) + duration
+
+        return dict(trial=self._trial, totals=dict(**_sum_calls(calls), phases=phases, tools=_sum_tools(tools)),
+                    iterations=iterations)
+
+    def write(self) -> None:
+        self._out.parent.mkdir(parents=True, exist_ok=True)
+        self._out.write_text(json.dumps(self.to_dict(), indent=2))
+
+
+def aggregate_trials(metrics_files: list[Path], out: Path) -> None:
+    """ Aggregates the totals of the metrics files of multiple trials into a single json file. """
+    trials = dict()
+    for file in [f for f in metrics_files if f.exists()]:
+        data = json.loads(file.read_text())
+        trials[f"{data['trial']:02d}" if data["trial"] is not None else file.parent.name] = data["totals"]
+
+    totals = _sum_calls([]) | dict(phases=dict())
+    for trial in trials.values():
+        for key, value in trial.items():
+            if key == "phases":
+                for name, duration in value.items():
+                    totals["phases"][name] = totals["phases"].get(name, 0.0) + duration
+            elif key != "tools":
+                totals[key] += value
+    totals["tools"] = _sum_tools([trial["tools"] for trial in trials.values()])
+
+    out.write_text(json.dumps(dict(totals=totals, trials=trials), indent=2))
+    LOGGER.info(f"Metrics of {len(trials)} trials aggregated at {out.absolute()}")
@@ -75,3 +75,7 @@ def litellm_model(model: Model) -> str:
         return "anthropic/" + model.value
 
     return ""
+
+
+def provider(model: Model) -> str:
+    return litellm_model(model).split("/")[0]
@@ -2,9 +2,15 @@ from pathlib import Path
 
 
 class Paths:
-    def __init__(self, root: Path, inputs: Path, put_name: str) -> None:
+    def __init__(self, root: Path, inputs: Path, put_name: str, trial: int | None = None) -> None:
         self.root = root.resolve()
-        self.config = self.root.joinpath("config").resolve()
+        self.trial = trial
+
+        # isolated workspace per trial (if running multiple trials in parallel), also the cwd of the test executions
+        # (pytest-html-report looks up its config from the cwd)
+        self.workspace = (self.root if trial is None else self.root.joinpath("trials", f"trial_{trial:02d}")).resolve()
+        self.config = self.workspace.joinpath("config").resolve()
+        self.cache = self.workspace.joinpath(".cache").resolve()
 
         self.inputs = inputs.resolve()
         self.req_doc = self.inputs.joinpath("program-requirements.yml").resolve()
@@ -12,9 +18,14 @@ class Paths:
         self.html_template = self.inputs.joinpath("pytest_html_report.yml").resolve()
 
         self.archive = self.root.joinpath(".archive").resolve()
+        if trial is not None:
+            self.archive = self.archive.joinpath(f"archive_{trial:02d}").resolve()
         self.conversation_archive = self.archive.joinpath("conversations").resolve()
+        self.logs = self.archive.joinpath("logs").resolve()
+        self.metrics = self.archive.joinpath("metrics.json").resolve()
+        self.checkpoint = self.archive.joinpath("checkpoint.json").resolve()
 
-        self.project = self.root.joinpath("project").resolve()
+        self.project = self.workspace.joinpath("project").resolve()
         self.put = self.project.joinpath(put_name).resolve()
         self.tests = self.project.joinpath("tests").resolve()
         self.reports = self.project.joinpath("reports").resolve()
@@ -2,84 +2,163 @@ from logging import getLogger
 from pathlib import Path
 
 from .agents import Generator, GeneratorState, Debugger, Evaluator
-from .archiving import archive_agent, archive_suite, archive_tests, archive_reports
+from .archive_worker import init_archive_worker, flush_archive_worker
+from .archiving import archive_agent, archive_suite, archive_tests, archive_reports, log_conversation
 from .archiving import SuiteType as SType
+from .checkpoint import Checkpoint, GENERATION, EXECUTION, DEBUGGING, EVALUATION, CONCLUDED
 from .config import LiftConfig
+from .metrics import MetricsRecorder
 from .paths import Paths
 from .project_utils import ToolCallResult
 from .prompts import Prompts
+from .pytest_worker import init_pytest_worker, shutdown_pytest_worker
 from .requirements import parse_requirements_doc
 from .tools import init_tools
-from .utils import check_inputs, setup_new_project, execute_tests
+from .utils import check_inputs, setup_new_project, build_indices, load_reports, execute_tests, execute_regression
 
 LOGGER = getLogger(__name__)
 
 
 class Process:
-    def __init__(self, root: Path, inputs: Path, env_file: Path):
+    def __init__(self, root: Path, inputs: Path, env_file: Path, trial: int | None = None, resume: bool = False):
         self._config = LiftConfig(env_file)
-        self._paths = Paths(root, inputs, self._config.put_name)
+        self._paths = Paths(root, inputs, self._config.put_name, trial)
+        self._resume = resume
 
-        check_inputs(self._config, self._paths)
+        check_inputs(self._config, self._paths, resume)
 
         self._prompts = Prompts(self._paths.inputs, self._config.put_name)
         self._reqs = parse_requirements_doc(self._paths.inputs / "program-requirements.yml")
 
         init_tools(self._paths.project, self._reqs)
 
-    def run(self):
-        setup_new_project(self._config, self._paths, self._reqs)
-
-        first_final = True
-        iteration = 0
+        self._metrics = MetricsRecorder(self._paths.metrics, trial)
+
+    def _restore(self) -> Checkpoint | None:
+        """ Restores the project (tests & reports), metrics and loop state of the last checkpoint. Returns None if
+        the run was never started (nothing to resume). """
+        state = Checkpoint.load(self._paths)
+        if state is None and not self._paths.project.exists():
+            LOGGER.info("No checkpoint & project found, starting a new run")
+            return None
+        if state is None:
+            LOGGER.error(f"No checkpoint found at {self._paths.checkpoint.absolute()}. No LIFT process resumed!")
+            raise FileNotFoundError("LIFT checkpoint missing!")
+
+        if not self._paths.project.exists():
+            setup_new_project(self._config, self._paths, self._reqs)
+        state.restore(self._paths)
+        build_indices(self._paths)
+        load_reports(self._paths)
+        self._metrics.load()
+
+        # drop the FSS archived by an interrupted evaluation (it is archived again)
+        if state.first_final and state.pending(EVALUATION):
+            (self._paths.archive / "manifests" / f"{SType.FSS.name}.json").unlink(missing_ok=True)
+
+        LOGGER.info(f"Resuming at iteration {state.iteration} (last completed phase: '{state.phase or '-'}')")
+        return state
 
-        gen_state = GeneratorState.INIT
-        for iteration in range(self._config.max_iterations):
+    def run(self):
+        init_archive_worker()
+        try:
+            self._run()
+        finally:
+            # barrier: all archiving of the run is written before returning (or crashing)
+            flush_archive_worker()
+
+    def _run(self):
+        state = self._restore() if self._resume else None
+        if state is None:
+            setup_new_project(self._config, self._paths, self._reqs)
+            state = Checkpoint()
+            state.save(self._paths)
+
+        if state.phase == CONCLUDED:
+            LOGGER.info("LIFT already concluded!")
+            return
+
+        # keep a warm pytest worker for the test executions (daemon, terminated on exit)
+        if self._config.warm_tests:
+            init_pytest_worker(self._paths.project)
+
+        for iteration in range(state.iteration, self._config.max_iterations):
             LOGGER.info(f"--- ITERATION #{iteration:02d} ---")
 
-            # generate/refine suite
-            LOGGER.info(" + GENERATION + ")
-            generator = Generator(self._config.api_key, self._config.generator, self._prompts.generator, iteration)
-            generator.run(gen_state)
-            archive_agent(self._paths.conversation_archive, generator, iteration)
-
-            # archive last iterations output + feedback
-            archive_reports(self._paths.archive, self._paths.reports, iteration - 1) if iteration > 0 else None
-
-            # execute test suite
-            LOGGER.info(" + EXECUTION + ")
-            passing = execute_tests(self._config.put_name, self._paths)
-
-            if not passing:
+            if state.pending(GENERATION):
+                # generate/refine suite
+                LOGGER.info(" + GENERATION + ")
+                generator = Generator(self._config.api_key, self._config.generator, self._prompts.generator,
+                                      iteration, self._config.parallel_tools)
+                log_conversation(self._paths.conversation_archive, generator, iteration)
+                with self._metrics.phase(iteration, "generation"):
+                    generator.run(GeneratorState[state.gen_state])
+                self._metrics.record_agent(iteration, generator)
+                archive_agent(self._paths.conversation_archive, generator, iteration)
+
+                # archive last iterations output + feedback
+                archive_reports(self._paths.archive, self._paths.reports, iteration - 1) if iteration > 0 else None
+                state.advance(GENERATION, self._paths)
+
+            if state.pending(EXECUTION):
+                # execute test suite
+                LOGGER.info(" + EXECUTION + ")
+                with self._metrics.phase(iteration, "execution"):
+                    state.passing = execute_tests(self._config.put_name, self._paths, self._config.incremental_tests,
+                                                  self._config.test_workers, self._config.impact_index)
+                state.advance(EXECUTION, self._paths)
+
+            if not state.passing and state.pending(DEBUGGING):
                 # provide fixes (DEBUGGER)
                 LOGGER.info(" + DEBUGGER + ")
                 debugger = Debugger(self._config.api_key, self._config.debugger, self._prompts.debugger,
-                                    self._paths.reports, iteration)
-                debugger.debug()
-                gen_state = GeneratorState.ERROR
+                                    self._paths.reports, iteration, self._config.parallel_tools)
+                log_conversation(self._paths.conversation_archive, debugger, iteration)
+                with self._metrics.phase(iteration, "debugging"):
+                    debugger.debug()
+                self._metrics.record_agent(iteration, debugger)
+                state.gen_state = GeneratorState.ERROR.name
                 archive_agent(self._paths.conversation_archive, debugger, iteration)
+                state.advance(DEBUGGING, self._paths)
 
-            else:
+            elif state.passing and state.pending(EVALUATION):
                 # run EVALUATOR
                 LOGGER.info(f" + EVALUATION + ")
                 evaluator = Evaluator(self._config.api_key, self._config.evaluator, self._prompts.evaluator,
-                                      self._paths.reports, iteration)
-                evaluation = evaluator.evaluate()
-                gen_state = GeneratorState.REFINE
+                                      self._paths.reports, iteration, self._config.parallel_tools)
+                log_conversation(self._paths.conversation_archive, evaluator, iteration)
+                with self._metrics.phase(iteration, "evaluation"):
+                    evaluation = evaluator.evaluate()
+                self._metrics.record_agent(iteration, evaluator)
+                state.gen_state = GeneratorState.REFINE.name
                 archive_agent(self._paths.conversation_archive, evaluator, iteration)
 
                 # archive FSS (First Sufficient Suite)
-                if evaluation == ToolCallResult.END_FINAL_SUITE and first_final:
+                if evaluation == ToolCallResult.END_FINAL_SUITE and state.first_final:
                     archive_suite(self._paths.archive, self._paths.tests, self._paths.reports, SType.FSS, iteration)
-                    first_final = False
+                    state.first_final = False
 
                 # archive LPS (Last Passing Suite)
                 archive_suite(self._paths.archive, self._paths.tests, self._paths.reports, SType.LPS, iteration)
+                state.advance(EVALUATION, self._paths)
 
             # archive tests
             archive_tests(self._paths.archive, self._paths.tests, iteration)
+            state.next_iteration(self._paths)
 
         # archive last iteration
-        archive_reports(self._paths.archive, self._paths.reports, iteration)
+        archive_reports(self._paths.archive, self._paths.reports, max(state.iteration - 1, 0))
+        state.advance(CONCLUDED, self._paths)
+        shutdown_pytest_worker()
 
         LOGGER.info("LIFT concluded!")
+
+    def regress(self, suite: Path) -> bool:
+        """ Sets up the project with the current PUT version and executes only the tests of the archived suite manifest
+        (e.g. FSS/LPS) that cover changed lines of the PUT. Returns True if all executed tests passed. """
+        setup_new_project(self._config, self._paths, self._reqs)
+
+        LOGGER.info(f" + REGRESSION ({suite.stem}) + ")
+        passing = execute_regression(self._config.put_name, self._paths, suite.resolve(), self._config.test_workers)
+        LOGGER.info(f"Regression run {'passed' if passing else 'failed'} (reports at {self._paths.reports.absolute()})")
+        return passing
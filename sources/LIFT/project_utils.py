@@ -2,12 +2,13 @@ from enum import Enum
 from typing import Any, Dict, List
 
 
-def tool_metadata(description: str, properties: Dict[str, Any], required: List[str] = None):
+def tool_metadata(description: str, properties: Dict[str, Any], required: List[str] = None, read_only: bool = False):
     def decorator(fn):
         fn.name = fn.__name__.split("tool_")[-1]
         fn.description = description
         fn.properties = properties
         fn.required = required
+        fn.read_only = read_only
         return fn
 
     return decorator
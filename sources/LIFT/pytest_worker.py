@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import re
+import sys
+from logging import getLogger
+from multiprocessing.connection import Connection
+from pathlib import Path
+
+from coverage import CoverageData
+
+LOGGER = getLogger(__name__)
+
+
+RUN_TIMEOUT = 30 * 60  # seconds, a run taking longer is considered hung (the worker is killed)
+
+TEST_MODULE_PATTERN = re.compile(r"^(test_.*|.*_test)\.py$")
+
+
+def _snapshot(project: Path) -> dict[Path, tuple[int, int]]:
+    """ Returns the (mtime, size) of all python files of the project (PUT & tests). """
+    snapshot = dict()
+    for file in project.rglob("*.py"):
+        if not any(part == "__pycache__" or part.startswith(".") for part in file.relative_to(project).parts):
+            stat = file.stat()
+            snapshot[file.resolve()] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def _purge_modules(project: Path, changed: set[Path]) -> bool:
+    """ Removes the changed modules of the project from sys.modules so they are re-imported in the next run. If a
+    changed file is not a test module (PUT, conftest, helpers), all project modules are purged, as the others may
+    hold references to it. Returns True if all project modules were purged. """
+    loaded = {name: Path(module.__file__).resolve() for name, module in list(sys.modules.items())
+              if getattr(module, "__file__", None) and project in Path(module.__file__).resolve().parents}
+    purge_all = any(TEST_MODULE_PATTERN.match(file.name) is None for file in changed)
+    [sys.modules.pop(name) for name, file in loaded.items() if purge_all or file in changed]
+    return purge_all
+
+
+def _read_import_coverage(cov_file: Path) -> tuple[bool, dict[str, list]]:
+    """ Returns the context-free (import-time) coverage of a run (recorded with test contexts). """
+    data = CoverageData(basename=str(cov_file))
+    data.read()
+    for file in cov_file.parent.glob(cov_file.name + ".*"):
+        part = CoverageData(basename=str(file))
+        part.read()
+        data.update(part)
+
+    data.set_query_contexts([r"^$"])
+    measured = {f: (data.arcs(f) if data.has_arcs() else data.lines(f)) for f in data.measured_files()}
+    return data.has_arcs(), {f: m for f, m in measured.items() if m}
+
+
+def _serve(conn: Connection, project: str) -> None:
+    """ Main loop of the warm test worker: executes pytest in-process for every received run request. Only changed
+    modules are re-imported. As coverage misses the import of the kept PUT modules, their import-time coverage (of
+    the run importing them) is added to the coverage data of every run (as additional data file). """
+    import pytest
+
+    project = Path(project)
+    snapshot, arcs, import_coverage = dict(), True, dict()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        current = _snapshot(project)
+        changed = {file for file in snapshot.keys() | current.keys() if snapshot.get(file) != current.get(file)}
+        if _purge_modules(project, changed):
+            import_coverage = dict()
+        snapshot = current
+
+        args = [*request["args"], *([] if "--cov-context=test" in request["args"] else ["--cov-context=test"])]
+        cov_file = Path(request["cwd"], request["env"].get("COVERAGE_FILE", ".coverage")).absolute()
+        env, cwd = dict(os.environ), os.getcwd()
+        os.environ.update(request["env"])
+        os.chdir(request["cwd"])
+        try:
+            # a leftover import-time coverage file would be combined into the run by pytest-cov
+            Path(str(cov_file) + ".warm").unlink(missing_ok=True)
+            code = int(pytest.main(args))
+
+            arcs, measured = _read_import_coverage(cov_file)
+            for file, m in measured.items():
+                import_coverage[file] = sorted(set(import_coverage.get(file, [])) | set(m))
+            if import_coverage:
+                kept = CoverageData(basename=str(cov_file) + ".warm")
+                kept.add_arcs(import_coverage) if arcs else kept.add_lines(import_coverage)
+                kept.write()
+        except BaseException as e:
+            LOGGER.error(f"Test worker run failed: {e!r}")
+            code = -1
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(env)
+
+        conn.send(code)
+
+
+class PytestWorker:
+    """ Long-lived process executing pytest runs in-process, saving the interpreter startup and the import of pytest,
+    its plugins and third-party dependencies for every execution. """
+
+    def __init__(self, project: Path, timeout: float = RUN_TIMEOUT):
+        self._project = project
+        self._timeout = timeout
+        self._conn: Connection | None = None
+        self._process: multiprocessing.Process | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> bool:
+        """ Starts the worker process. Returns True if the worker is running. """
+        try:
+            ctx = multiprocessing.get_context("spawn")
+            self._conn, child_conn = ctx.Pipe()
+            self._process = ctx.Process(target=_serve, args=(child_conn, str(self._project)), daemon=True)
+            self._process.start()
+            child_conn.close()
+            LOGGER.info(f"Warm test worker started (pid {self._process.pid})")
+        except Exception as e:
+            LOGGER.warning(f"Failed to start warm test worker: {e}")
+            self._process = None
+
+        return self.alive
+
+    def run(self, args: list[str], cwd: Path, env: dict[str, str]) -> int | None:
+        """ Executes pytest with the args (in cwd, with additional env vars) in the worker. Returns the pytest exit code
+        or None if the worker is not available (or died or timed out during the run). """
+        if not self.alive and not self.start():
+            return None
+
+        try:
+            self._conn.send(dict(args=[str(a) for a in args], cwd=str(cwd), env=env))
+            if not self._conn.poll(self._timeout):
+                LOGGER.warning(f"Warm test worker run timed out after {self._timeout} s, killing it")
+                self.kill()
+                return None
+            code = self._conn.recv()
+        except (EOFError, OSError) as e:
+            LOGGER.warning(f"Warm test worker died during run: {e!r}")
+            self.stop()
+            return None
+
+        return None if code < 0 else code
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+
+        try:
+            self._conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self._process.join(timeout=10)
+        if self._process.is_alive():
+            self._process.kill()
+        self._conn.close()
+        self._process, self._conn = None, None
+        LOGGER.info("Warm test worker stopped")
+
+    def kill(self) -> None:
+        """ Kills the (hung) worker, the next run starts a new one. """
+        if self._process is None:
+            return
+
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process, self._conn = None, None
+
+
+WORKER: PytestWorker | None = None
+
+
+def init_pytest_worker(project: Path) -> None:
+    global WORKER
+    WORKER = PytestWorker(project)
+    WORKER.start()
+
+
+def shutdown_pytest_worker() -> None:
+    global WORKER
+    if WORKER is not None:
+        WORKER.stop()
+        WORKER = None
+
+
+def run_in_worker(cmd: list, cwd: Path, env: dict[str, str]) -> int | None:
+    """ Executes a pytest command (sys.executable -m pytest ...) in cwd in the warm worker. Returns None if not
+    available. """
+    if WORKER is None:
+        return None
+    return WORKER.run(cmd[3:], cwd, env)
@@ -0,0 +1,195 @@
+import random
+import re
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from logging import getLogger
+from multiprocessing.managers import BaseManager
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+from openai import APIConnectionError, APIStatusError
+
+from .models import Model, provider, litellm_model
+
+LOGGER = getLogger(__name__)
+
+RETRY_STATUS_CODES = [408, 409, 429, 500, 502, 503, 504, 529]
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+
+# provider -> semaphore limiting the concurrent requests (shared between trial processes)
+PROVIDER_BUDGETS: dict[str, Any] = dict()
+
+# litellm model -> RateLimiter (or proxy of a RateLimiter shared between trial processes)
+LIMITERS: dict[str, Any] = dict()
+_LIMITERS_LOCK = Lock()
+
+
+def init_provider_budgets(budgets: dict[str, Any]) -> None:
+    global PROVIDER_BUDGETS
+    PROVIDER_BUDGETS = budgets
+
+
+def provider_slot(model: Model):
+    """ Returns a context manager holding one request slot of the models provider (no-op if unlimited). """
+    budget = PROVIDER_BUDGETS.get(provider(model))
+    return budget if budget is not None else nullcontext()
+
+
+class TokenBucket:
+    """ Token bucket refilling its capacity (per minute) continuously. Unlimited until a capacity is known. """
+
+    def __init__(self, capacity: float | None = None):
+        self.capacity = capacity
+        self.available = capacity or 0.0
+        self._last = monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.capacity:
+            self.available = min(self.capacity, self.available + (now - self._last) * self.capacity / 60)
+        self._last = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """ Takes amount from the bucket (may go into debt). Returns the secs to wait until the amount is covered. """
+        self._refill(now)
+        if not self.capacity:
+            return 0.0
+
+        amount = min(amount, self.capacity)
+        self.available -= amount
+        return max(0.0, -self.available * 60 / self.capacity)
+
+    def sync(self, limit: float | None, remaining: float | None, now: float) -> None:
+        """ Updates capacity & availability with the values reported by the provider (the reported remaining amount
+        replaces the local estimate, raising or lowering it). """
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None and self.capacity:
+            self.available = min(self.capacity, remaining)
+
+
+def _parse_duration(value: str) -> float | None:
+    """ Parses durations like '20ms', '1.5s' or '6m0s' (OpenAI reset headers) to secs. """
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or "")
+    if not parts:
+        return None
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * factors[unit] for number, unit in parts)
+
+
+def _parse_timestamp(value: str) -> float | None:
+    """ Parses RFC 3339 timestamps (Anthropic reset headers) to the secs from now. """
+    try:
+        return max(0.0, (datetime.fromisoformat(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header(headers: dict, *names: str) -> float | None:
+    for name in names:
+        if headers.get(name) is not None:
+            try:
+                return float(headers[name])
+            except ValueError:
+                return None
+    return None
+
+
+class RateLimiter:
+    """ Paces the requests of a model based on its requests-per-minute & tokens-per-minute limits (learnt from the
+    response headers) and pauses all requests after a rate limit was hit. """
+
+    def __init__(self):
+        self._requests = TokenBucket()
+        self._tokens = TokenBucket()
+        self._blocked_until = 0.0
+        self._lock = Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """ Reserves one request with the (estimated) number of tokens. Returns the secs to wait before sending. """
+        with self._lock:
+            now = monotonic()
+            wait = max(self._requests.reserve(1, now), self._tokens.reserve(tokens, now))
+            return max(wait, self._blocked_until - now)
+
+    def blocked(self) -> float:
+        """ Returns the secs to wait until requests are no longer blocked (without reserving anything). """
+        with self._lock:
+            return max(0.0, self._blocked_until - monotonic())
+
+    def update(self, headers: dict) -> None:
+        """ Syncs the buckets with the rate limit headers (OpenAI & Anthropic) of a response. """
+        headers = {k.lower().removeprefix("llm_provider-"): v for k, v in (headers or dict()).items()}
+        with self._lock:
+            now = monotonic()
+            self._requests.sync(_header(headers, "x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit"),
+                                _header(headers, "x-ratelimit-remaining-requests",
+                                        "anthropic-ratelimit-requests-remaining"), now)
+            self._tokens.sync(_header(headers, "x-ratelimit-limit-tokens", "anthropic-ratelimit-tokens-limit"),
+                              _header(headers, "x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining"),
+                              now)
+
+            # nothing left: block until the reported reset
+            if _header(headers, "x-ratelimit-remaining-requests") == 0:
+                reset = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+                self._blocked_until = max(self._blocked_until, now + (reset or 0))
+            if _header(headers, "anthropic-ratelimit-requests-remaining") == 0:
+                reset = _parse_timestamp(headers.get("anthropic-ratelimit-requests-reset"))
+                self._blocked_until = max(self._blocked_until, now + (reset or 0))
+
+    def penalize(self, secs: float) -> None:
+        """ Blocks all requests for secs (e.g. after a rate limit was hit). """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, monotonic() + secs)
+
+
+class RateLimiterManager(BaseManager):
+    """ Manager hosting RateLimiters shared between the trial processes. """
+
+
+RateLimiterManager.register("RateLimiter", RateLimiter)
+
+
+def init_rate_limiters(limiters: dict[str, Any]) -> None:
+    global LIMITERS
+    LIMITERS = limiters
+
+
+def get_rate_limiter(model: Model) -> Any:
+    """ Returns the RateLimiter of the model shared by all agents of the process (created if not existing). """
+    with _LIMITERS_LOCK:
+        return LIMITERS.setdefault(litellm_model(model), RateLimiter())
+
+
+def response_headers(response) -> dict:
+    """ Returns the (provider) headers of a litellm response (if available). """
+    hidden = getattr(response, "_hidden_params", None) or dict()
+    return hidden.get("additional_headers") or hidden.get("headers") or dict()
+
+
+def retry_after(e: Exception) -> float | None:
+    """ Returns the secs to wait before retrying suggested by the provider (header or error message). """
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or dict()
+    for name in ["retry-after-ms", "retry-after"]:
+        value = _header(dict(headers), name)
+        if value is not None:
+            return value / 1000 if name.endswith("-ms") else value
+
+    # e.g. "Please try again in 1.5s" / "Please try again in 6m0s" / "Please try again in 20ms"
+    match = re.search(r"try again in ([\d.hms]+)", str(e))
+    return _parse_duration(match.group(1)) if match else None
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, APIConnectionError):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code in RETRY_STATUS_CODES
+
+
+def backoff(attempt: int, suggested: float | None = None) -> float:
+    """ Returns the jittered exponential backoff (in secs) for the attempt (at least the suggested wait). """
+    wait = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+    return max(wait, (suggested or 0) + random.uniform(0, 1))
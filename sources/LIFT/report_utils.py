@@ -1,13 +1,19 @@
+import json
+import re
+import sys
 import xml.etree.ElementTree as ET
-from ast import literal_eval
 from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
+from logging import getLogger
 from pathlib import Path
+from typing import Iterable
 from xml.etree.ElementTree import Element
 
 from .requirements import Requirement
 
+LOGGER = getLogger(__name__)
+
 
 class TestType(Enum):
     UNIT = "unit"
@@ -15,7 +21,23 @@ class TestType(Enum):
     SYSTEM = "system"
 
 
-@dataclass
+OUTCOMES = {"failure": "failed", "error": "error", "skipped": "skipped"}
+_STRING_LITERAL = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+_ESCAPE = re.compile(r"\\(.)")
+
+
+def parse_str_values(value: str) -> list[str]:
+    """ Parses the repr of a string or a list/tuple of strings (as written to the report properties), e.g.
+    "['R1', 'R2']" or "'unit'" (without evaluating it). A bare value is returned as a single element. """
+    value = value.strip()
+    if value in ("", "[]", "()", "None"):
+        return []
+    if value[0] not in "[('\"":
+        return [value]
+    return [_ESCAPE.sub(r"\1", single or double) for single, double in _STRING_LITERAL.findall(value)]
+
+
+@dataclass(slots=True)
 class TestCase:
     clsname: str
     name: str
@@ -23,18 +45,27 @@ class TestCase:
     type_: TestType
 
     req_ids: list[str]
+    outcome: str = "passed"
+
+    @property
+    def id(self) -> str:
+        return f"{self.clsname}::{self.name}"
 
     @staticmethod
     def parse(case: Element) -> "TestCase":
         properties = {it.get("name"): it.get("value") for it in case.find("properties").findall("property")}
         properties["categories"] = "'unit'"
 
+        # the outcome is given by the (first) result child element (none if passed)
+        result = next((child.tag for child in case if child.tag in OUTCOMES), None)
+
         return TestCase(
-            clsname=case.get("classname"),
+            clsname=sys.intern(case.get("classname")),
             name=case.get("name"),
-            description=properties["test_description"],
-            type_=TestType(literal_eval(properties["categories"])),
-            req_ids=literal_eval(properties["functional_specification"])
+            description=properties.get("test_description", ""),
+            type_=TestType(parse_str_values(properties["categories"])[0]),
+            req_ids=[sys.intern(id_) for id_ in parse_str_values(properties.get("functional_specification", "[]"))],
+            outcome=OUTCOMES.get(result, "passed")
         )
 
     def to_dict(self):
@@ -43,6 +74,7 @@ class TestCase:
         dict_["name"] = self.name
         dict_["type"] = self.type_.value
         dict_["req_ids"] = self.req_ids
+        dict_["outcome"] = self.outcome
         return dict_
 
 
@@ -56,17 +88,41 @@ class TestSuite:
     tests: list[TestCase]
 
     @staticmethod
-    def parse(suites: Element) -> "TestSuite":
-        suite = suites.find("testsuite")
+    def parse(report_file: Path) -> "TestSuite":
+        """ Parses the (first) testsuite of a junit report in a streaming way: every test case is parsed when its
+        element is complete and then dropped from the tree, so the memory stays bounded for huge reports. """
+        suite, attrs, tests = None, None, []
+        for event, elem in ET.iterparse(report_file, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "testsuite" and suite is None:
+                    suite, attrs = elem, dict(elem.attrib)
+                continue
+
+            if elem.tag == "testcase" and suite is not None:
+                if elem.find("properties") is not None:
+                    try:
+                        tests.append(TestCase.parse(elem))
+                    except (TypeError, ValueError, IndexError) as e:
+                        LOGGER.warning(f"Skipping malformed test case {elem.get('classname')}::{elem.get('name')} "
+                                       f"in {report_file}: {e!r}")
+                elem.clear()
+                if len(suite) and suite[-1] is elem:
+                    del suite[-1]
+            elif elem is suite:
+                break
+
+        if attrs is None:
+            raise ValueError(f"No testsuite found in {report_file}")
+
         return TestSuite(
-            errors=int(suite.get("errors")),
-            tests_total=int(suite.get("tests")),
-            tests_failed=int(suite.get("failures")),
-            tests_skipped=int(suite.get("skipped")),
-            tests=[TestCase.parse(it) for it in suite.findall("testcase") if it.get("error") is not None],
+            errors=int(attrs.get("errors")),
+            tests_total=int(attrs.get("tests")),
+            tests_failed=int(attrs.get("failures")),
+            tests_skipped=int(attrs.get("skipped")),
+            tests=tests,
         )
 
-    def get_tests_with_incorrect_req_ids(self, all_reqs: list[Requirement]) -> list[TestCase]:
+    def get_tests_with_incorrect_req_ids(self, all_reqs: Iterable[Requirement]) -> list[TestCase]:
         """ Returns a list of TestCases that have at least one Requirement id referenced that is not present in the loaded requirements. """
         req_ids = {req.id for req in all_reqs}
 
@@ -78,22 +134,118 @@ class TestSuite:
         return invalid_links
 
 
-_TESTSUITE: TestSuite
-
-
-def parse_cur_exec_report(report_file: Path) -> TestSuite | None:
-    """ Parses the last execution report (xml) generated by pytest (if available). Returns the parsed suite or None (if not available). """
+def junit_test_id(node_id: str) -> str:
+    """ Returns the JUnit test id (classname::name) of a pytest node id (e.g. 'tests/test_a.py::TestA::test_f'). """
+    module, *scopes, name = node_id.split("::")
+    return "::".join([".".join([module.removesuffix(".py").replace("/", "."), *scopes]), name])
+
+
+class TraceabilityMatrix:
+    """ Requirement id x test case matrix (with the test outcomes) of the last execution. It is updated from the
+    parsed suite by diffing against the previous execution, so only added/removed/changed tests are re-linked and
+    the changes since the previous execution are available. If the per-test coverage (test-impact index) was
+    recorded, the PUT lines covered by the linked tests are available per requirement. """
+
+    def __init__(self):
+        self._tests: dict[str, tuple[tuple[str, ...], str]] = dict()  # test id -> (req ids, outcome)
+        self._reqs: dict[str, dict[str, str]] = dict()  # req id -> test id -> outcome
+        self._coverage: dict[str, dict[str, list[int]]] | None = None  # test id -> PUT file -> covered lines
+        self.changes: dict[str, list[str]] = dict()
+
+    def _link(self, test_id: str, req_ids: tuple[str, ...], outcome: str) -> None:
+        for req_id in req_ids:
+            self._reqs.setdefault(req_id, dict())[test_id] = outcome
+
+    def _unlink(self, test_id: str, req_ids: tuple[str, ...]) -> None:
+        for req_id in req_ids:
+            tests = self._reqs[req_id]
+            tests.pop(test_id)
+            if not tests:
+                self._reqs.pop(req_id)
+
+    def status(self, req_id: str) -> str:
+        """ Returns 'uncovered' (no linked test), 'failing' (a linked test failed/errored) or 'passing'. """
+        outcomes = self._reqs.get(req_id, dict()).values()
+        if not any(outcome != "skipped" for outcome in outcomes):
+            return "uncovered"
+        return "failing" if any(outcome in ("failed", "error") for outcome in outcomes) else "passing"
+
+    def update(self, suite: TestSuite) -> None:
+        tests = {test.id: (tuple(dict.fromkeys(test.req_ids)), test.outcome) for test in suite.tests}
+        changed = [id_ for id_ in self._tests.keys() | tests.keys() if self._tests.get(id_) != tests.get(id_)]
+
+        affected = {req_id for id_ in changed for entry in (self._tests.get(id_), tests.get(id_)) if entry
+                    for req_id in entry[0]}
+        before = {req_id: self.status(req_id) for req_id in affected}
+
+        for id_ in changed:
+            if id_ in self._tests:
+                self._unlink(id_, self._tests.pop(id_)[0])
+            if id_ in tests:
+                self._tests[id_] = tests[id_]
+                self._link(id_, *tests[id_])
+
+        self.changes = dict(tests_changed=sorted(changed))
+        for req_id in sorted(affected):
+            after = self.status(req_id)
+            if after != before[req_id]:
+                self.changes.setdefault(f"now_{after}", []).append(req_id)
+
+    def tests_of(self, req_id: str) -> dict[str, str]:
+        """ Returns the linked tests (test id -> outcome) of a requirement. """
+        return dict(self._reqs.get(req_id, dict()))
+
+    def update_coverage(self, impact_index: Path | None) -> None:
+        """ Loads the per-test coverage of the test-impact index (None if not recorded). """
+        self._coverage = None
+        if impact_index is not None and impact_index.exists():
+            self._coverage = {junit_test_id(test): files
+                              for test, files in json.loads(impact_index.read_text())["tests"].items() if "::" in test}
+
+    def coverage_of(self, req_id: str) -> dict[str, list[int]] | None:
+        """ Returns the PUT lines (file -> lines) covered by the linked tests of a requirement (None if the per-test
+        coverage was not recorded). """
+        if self._coverage is None:
+            return None
+
+        covered: dict[str, set[int]] = dict()
+        for test_id in self._reqs.get(req_id, dict()):
+            for rel, lines in self._coverage.get(test_id, dict()).items():
+                covered.setdefault(rel, set()).update(lines)
+        return {rel: sorted(lines) for rel, lines in sorted(covered.items())}
+
+    def to_dict(self, req_ids: Iterable[str]) -> dict[str, dict]:
+        matrix = {req_id: dict(status=self.status(req_id), tests=self.tests_of(req_id)) for req_id in req_ids}
+        if self._coverage is not None:
+            for req_id, entry in matrix.items():
+                entry["covered_lines"] = {rel: len(lines) for rel, lines in self.coverage_of(req_id).items()}
+        return matrix
+
+
+_TESTSUITE: TestSuite | None = None
+_MATRIX = TraceabilityMatrix()
+
+
+def parse_cur_exec_report(report_file: Path, impact_index: Path | None = None) -> TestSuite | None:
+    """ Parses the last execution report (xml) generated by pytest (if available) and updates the traceability
+    matrix (incl. the per-test coverage of the test-impact index, if recorded). Returns the parsed suite or None (if
+    not available). """
     global _TESTSUITE
 
     if not report_file.exists():
         return None
 
-    tree = ET.parse(report_file)
-    root = tree.getroot()
-    _TESTSUITE = TestSuite.parse(root)
+    _TESTSUITE = TestSuite.parse(report_file)
+    _MATRIX.update(_TESTSUITE)
+    _MATRIX.update_coverage(impact_index)
     return _TESTSUITE
 
 
 def get_current_suite() -> TestSuite | None:
     """ Returns the last execution report (xml) generated by pytest (if available else None). """
     return _TESTSUITE
+
+
+def get_traceability_matrix() -> TraceabilityMatrix:
+    """ Returns the requirement x test traceability matrix of the last execution. """
+    return _MATRIX
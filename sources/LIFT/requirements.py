@@ -1,7 +1,8 @@
 from collections import OrderedDict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from logging import getLogger
 from pathlib import Path
+from typing import KeysView
 
 import yaml
 
@@ -29,6 +30,25 @@ class ReqScope:
     title: str
     scopes: list["ReqScope"] | None
     reqs: list[Requirement] | None
+    # lookup indices (built once at construction; scopes are built bottom-up, so children are already indexed)
+    _flat: tuple[Requirement, ...] = field(init=False, repr=False, compare=False)
+    _by_id: dict[str, Requirement] = field(init=False, repr=False, compare=False)
+    _scope_paths: dict[str, tuple[str, ...]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._by_id, self._scope_paths = dict(), dict()
+        if self.reqs:
+            self._flat = tuple(self.reqs)
+            for req in self.reqs:
+                self._by_id.setdefault(req.id, req)
+                self._scope_paths.setdefault(req.id, (self.title,))
+        else:
+            self._flat = tuple(req for scope in self.scopes or [] for req in scope._flat)
+            for scope in self.scopes or []:
+                # like the former recursive scan, the first requirement of a duplicated id wins
+                for id_, req in scope._by_id.items():
+                    self._by_id.setdefault(id_, req)
+                    self._scope_paths.setdefault(id_, (self.title, *scope._scope_paths[id_]))
 
     @staticmethod
     def parse_yaml(yaml_data: list[dict] | dict) -> "ReqScope | None":
@@ -57,27 +77,18 @@ class ReqScope:
 
         return dict_
 
-    def get_requirements(self) -> list[Requirement]:
-        if self.reqs:
-            return self.reqs
+    def get_requirements(self) -> tuple[Requirement, ...]:
+        return self._flat
 
-        reqs = []
-        [reqs.extend(scope.get_requirements()) for scope in self.scopes]
-        return reqs
+    def get_requirement_ids(self) -> KeysView[str]:
+        return self._by_id.keys()
 
     def find_requirement(self, id: str) -> Requirement | None:
-        if self.reqs:
-            for req in self.reqs:
-                if req.id == id:
-                    return req
-
-        if self.scopes:
-            for scope in self.scopes:
-                req = scope.find_requirement(id)
-                if req:
-                    return req
+        return self._by_id.get(id)
 
-        return None
+    def get_scope_path(self, id: str) -> tuple[str, ...] | None:
+        """ Returns the titles of the scopes (from this scope down) containing the requirement. """
+        return self._scope_paths.get(id)
 
 
 def parse_requirements_doc(req_doc: Path) -> ReqScope:
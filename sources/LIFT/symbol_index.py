@@ -0,0 +1,119 @@
+import ast
+import hashlib
+import json
+from logging import getLogger
+from pathlib import Path
+from threading import Lock
+
+LOGGER = getLogger(__name__)
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        return f"class {node.name}({', '.join(bases)})" if bases else f"class {node.name}"
+
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _symbols(tree: ast.Module) -> list[dict]:
+    """ Returns the module, classes & functions (incl. nested ones) of a parsed module in source order. """
+    symbols = [dict(name="<module>", qualname="<module>", kind="module", signature="",
+                    doc=ast.get_docstring(tree) or "", start=1, end=max((n.end_lineno for n in tree.body), default=1),
+                    decorators=[])]
+
+    def visit(body: list[ast.stmt], scope: str, in_class: bool):
+        for node in body:
+            if not isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            qualname = f"{scope}.{node.name}" if scope else node.name
+            kind = "class" if isinstance(node, ast.ClassDef) else "method" if in_class else "function"
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            symbols.append(dict(name=node.name, qualname=qualname, kind=kind, signature=_signature(node),
+                                doc=ast.get_docstring(node) or "", start=start, end=node.end_lineno,
+                                decorators=[ast.unparse(d) for d in node.decorator_list]))
+            visit(node.body, qualname, isinstance(node, ast.ClassDef))
+
+    visit(tree.body, "", False)
+    return symbols
+
+
+class SymbolIndex:
+    """ Index of the symbols (modules, classes, functions, signatures, docstrings & line ranges) of the python files
+    under a root, parsed with ast. The symbols are cached on disk in one file per content hash, so only changed files
+    are re-parsed on a rebuild and an update only writes the entry of the changed file. """
+
+    def __init__(self):
+        self._project: Path | None = None
+        self._root: Path | None = None
+        self._cache_dir: Path | None = None
+        self._files: dict[str, dict] = dict()
+        self._lock = Lock()
+
+    def build(self, project: Path, root: Path, cache_dir: Path) -> None:
+        self._project, self._root, self._cache_dir = project, root, cache_dir
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        files, parsed = dict(), 0
+        for file in sorted(root.rglob("*.py")):
+            if any(part == "__pycache__" or part.startswith(".") for part in file.relative_to(root).parts):
+                continue
+            rel = file.relative_to(project).as_posix()
+            digest = hashlib.sha256(file.read_bytes()).hexdigest()
+            entry = cache_dir / f"{digest}.json"
+            if entry.exists():
+                files[rel] = json.loads(entry.read_text())
+            else:
+                files[rel] = self._parse(file, digest)
+                parsed += 1
+
+        # drop the entries of files that no longer exist (in this version)
+        digests = {entry["hash"] for entry in files.values()}
+        [entry.unlink() for entry in cache_dir.glob("*.json") if entry.stem not in digests]
+
+        with self._lock:
+            self._files = files
+        LOGGER.info(f"Symbol index built: {len(files)} modules ({parsed} parsed, {len(files) - parsed} cached)")
+
+    def _parse(self, file: Path, digest: str) -> dict:
+        """ Parses the file and stores its symbols in the cache. """
+        try:
+            entry = dict(hash=digest, symbols=_symbols(ast.parse(file.read_bytes(), filename=str(file))))
+        except (SyntaxError, ValueError) as e:
+            LOGGER.warning(f"Could not parse {file}: {e}")
+            entry = dict(hash=digest, symbols=[], error=str(e))
+
+        (self._cache_dir / f"{digest}.json").write_text(json.dumps(entry))
+        return entry
+
+    def update(self, path: Path) -> None:
+        """ Re-parses (or drops) a changed python file / directory below the indexed root. """
+        if self._root is None or not (path == self._root or self._root in path.parents):
+            return
+
+        rel = path.relative_to(self._project).as_posix()
+        with self._lock:
+            for indexed in [r for r in self._files if r == rel or r.startswith(rel + "/")]:
+                self._files.pop(indexed)
+            if path.is_file() and path.suffix == ".py":
+                self._files[rel] = self._parse(path, hashlib.sha256(path.read_bytes()).hexdigest())
+
+    def outline(self, rel: str) -> list[dict] | None:
+        """ Returns the symbols (without line contents) of a module or None if the module is not indexed. """
+        with self._lock:
+            entry = self._files.get(rel)
+        return None if entry is None else entry["symbols"]
+
+    def find(self, name: str) -> list[dict]:
+        """ Returns the symbols matching a (simple or qualified, optionally module-prefixed) name incl. the path. """
+        module, _, qualname = name.rpartition(":")
+        with self._lock:
+            items = list(self._files.items())
+        return [dict(path=rel, **symbol) for rel, entry in items
+                if not module or rel == module or rel.endswith("/" + module)
+                for symbol in entry["symbols"] if qualname in (symbol["name"], symbol["qualname"])]
+
+
+SYMBOL_INDEX = SymbolIndex()
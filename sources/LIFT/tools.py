@@ -1,15 +1,24 @@
 import base64
+import os
+import re
 import shutil
 from pathlib import Path
 from typing import Any, Optional, Dict, List
 
+from .code_index import CODE_INDEX
+from .coverage_utils import get_current_coverage, get_coverage_delta
+from .file_cache import FILE_CACHE, read_window
 from .project_utils import tool_metadata
-from .report_utils import get_current_suite
+from .report_utils import get_current_suite, get_traceability_matrix
 from .requirements import ReqScope
+from .symbol_index import SYMBOL_INDEX
+from .tree_index import TREE_INDEX
 
 PROJECT_PATH: Path = None
 REQS: ReqScope = None
 
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
 
 def init_tools(project_path: Path, reqs: ReqScope):
     global PROJECT_PATH, REQS
@@ -28,9 +37,17 @@ def safe_path(rel: str) -> Optional[Path]:
     return p
 
 
+def _invalidate(p: Path) -> None:
+    """ Invalidates the cached file contents & directory listings of a changed path. """
+    FILE_CACHE.invalidate(p)
+    TREE_INDEX.invalidate(p)
+    CODE_INDEX.update(p)
+    SYMBOL_INDEX.update(p)
+
+
 @tool_metadata(
     description="Recursively list files and directories under a path (relative to repo root), filtered by a glob. "
-                "Can optionally include hidden entries.",
+                "Can optionally include hidden entries. Results are paginated (see `offset` & `max_entries`).",
     properties={
         "path": {
             "type": "string",
@@ -47,9 +64,22 @@ def safe_path(rel: str) -> Optional[Path]:
             "description": "Include hidden files/folders (names starting with '.').",
             "default": False,
         },
-    }
+        "offset": {
+            "type": "integer",
+            "description": "Number of (sorted) entries to skip.",
+            "default": 0,
+        },
+        "max_entries": {
+            "type": "integer",
+            "description": "Maximum number of entries to return.",
+            "default": 1000,
+            "minimum": 1,
+        },
+    },
+    read_only=True
 )
-def tool_list_dir(path: str = ".", glob: str = "*", include_hidden: bool = False) -> Dict[str, Any]:
+def tool_list_dir(path: str = ".", glob: str = "*", include_hidden: bool = False,
+                  offset: int = 0, max_entries: int = 1000) -> Dict[str, Any]:
     """
     Recursively list all files and directories under the given path, filtered by glob.
 
@@ -57,6 +87,8 @@ def tool_list_dir(path: str = ".", glob: str = "*", include_hidden: bool = False
         path (str): Starting directory relative to the repo root. Defaults to "." (root).
         glob (str): Glob pattern to filter results. Defaults to "*" (everything).
         include_hidden (bool): Whether to include hidden files/folders (names starting with '.').
+        offset (int): Number of (sorted) entries to skip.
+        max_entries (int): Maximum number of entries to return.
     """
     p = safe_path(path)
     if p is None:
@@ -64,23 +96,14 @@ def tool_list_dir(path: str = ".", glob: str = "*", include_hidden: bool = False
     if not p.exists():
         return {"error": f"Path not found: {path}"}
 
-    entries = []
-    for child in p.rglob(glob):
-        rel_path = child.relative_to(PROJECT_PATH)
-        # always skip caches
-        if any("cache" in part for part in rel_path.parts):
-            continue
-        # Skip hidden entries if not allowed
-        if not include_hidden:
-            if not include_hidden and any(part.startswith(".") for part in rel_path.parts):
-                continue
-        rel = rel_path.as_posix()
-        if child.is_dir():
-            entries.append({"path": rel + "/", "is_directory": True})
-        else:
-            entries.append({"path": rel, "is_file": True, "bytes_size": len(child.read_bytes())})
+    if not p.is_dir():
+        return {"error": f"Path is not a directory: {path}"}
 
-    return {"entries": sorted(entries, key=lambda e: e["path"])}
+    entries = sorted(TREE_INDEX.walk(PROJECT_PATH, p, glob, include_hidden), key=lambda e: e["path"])
+    page = entries[offset:offset + max_entries]
+
+    next_offset = offset + len(page) if len(entries) > offset + len(page) else None
+    return {"entries": page, "total": len(entries), "next_offset": next_offset}
 
 
 def _read_file_common(rel: str, offset: int, max_bytes: int) -> Dict[str, Any]:
@@ -106,17 +129,14 @@ def _read_file_common(rel: str, offset: int, max_bytes: int) -> Dict[str, Any]:
         return {"path": rel, "error": "is_directory"}
 
     try:
-        raw = p.read_bytes()
+        raw, size = read_window(p, offset, max_bytes)
     except Exception as e:
         return {"path": rel, "error": f"read_failed: {e}"}
 
-    if offset > len(raw):
+    if offset > size:
         return {"path": rel, "error": "offset_after_EOF"}
 
-    truncated = False
-    if len(raw) > offset + max_bytes:
-        raw = raw[offset:offset + max_bytes]
-        truncated = True
+    truncated = size > offset + max_bytes
 
     try:
         text = raw.decode("utf-8")
@@ -151,7 +171,8 @@ def _read_file_common(rel: str, offset: int, max_bytes: int) -> Dict[str, Any]:
             "minimum": 1,
         },
     },
-    required=["path"]
+    required=["path"],
+    read_only=True
 )
 def tool_read_file(path: str, offset: int = 0, max_bytes: int = 200_000) -> Dict[str, Any]:
     """
@@ -245,6 +266,8 @@ def tool_write_file(path: str, content: str, overwrite: bool = True) -> Dict[str
         p.write_text(content, encoding="utf-8")
     except Exception as e:
         return {"error": f"Failed to write file: {e}"}
+    finally:
+        _invalidate(p)
 
     return {"ok": True}
 
@@ -283,6 +306,8 @@ def tool_delete_path(path: str) -> Dict[str, Any]:
             p.unlink()
     except Exception as e:
         return {"error": f"Failed to delete path: {e}"}
+    finally:
+        _invalidate(p)
 
     return {"ok": True}
 
@@ -346,13 +371,315 @@ def tool_replace_in_file(path: str, find: str, replace: str) -> Dict[str, Any]:
         p.write_text(new_text, encoding="utf-8")
     except Exception as e:
         return {"error": f"Failed to write file: {e}"}
+    finally:
+        _invalidate(p)
 
     return {"ok": True}
 
 
+def _diff_to_replacements(diff: str) -> List[tuple[str, str, Optional[int]]]:
+    """
+    Convert the hunks of a unified diff into (find, replace, line) triples.
+    The old side (context & removed lines) becomes `find`, the new side (context & added lines) `replace`.
+    `line` is the (1-based) start line of the new side from the hunk header (None if missing), used to anchor hunks
+    only inserting lines (empty `find`).
+    """
+    pairs, old, new, start = [], None, None, None
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            if old is not None:
+                pairs.append(("\n".join(old), "\n".join(new), start))
+            old, new = [], []
+            header = HUNK_HEADER.match(line)
+            start = int(header.group(1)) if header else None
+        elif old is None or line.startswith("\\"):
+            # file headers (---/+++) before the first hunk or "\ No newline at end of file"
+            continue
+        elif line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        else:
+            old.append(line[1:])
+            new.append(line[1:])
+
+    if old is not None:
+        pairs.append(("\n".join(old), "\n".join(new), start))
+    return pairs
+
+
+def _insert_lines(text: str, line: int, insert: str) -> Optional[str]:
+    """ Inserts the lines so the first one becomes the given (1-based) line. Returns None if out of range. """
+    lines = text.splitlines(keepends=True)
+    if not 1 <= line <= len(lines) + 1:
+        return None
+    if line == len(lines) + 1 and lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    return "".join(lines[:line - 1]) + insert + "\n" + "".join(lines[line - 1:])
+
+
+@tool_metadata(
+    description="Apply multiple edits to one or more UTF-8 text files at once. Each edit either replaces exactly one "
+                "occurrence of `find` with `replace` or applies the hunks of a unified diff (`diff`) to `path`. "
+                "Edits to the same file are applied in order. All edits are validated first and only applied if "
+                "all succeed (atomic). Returns a result per edit.",
+    properties={
+        "edits": {
+            "type": "array",
+            "description": "Edits to apply (in order).",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "File path relative to repo root."},
+                    "find": {"type": "string", "description": "Substring to locate (must occur exactly once)."},
+                    "replace": {"type": "string", "description": "Replacement substring."},
+                    "diff": {"type": "string", "description": "Unified diff hunk(s) (instead of find/replace)."},
+                },
+                "required": ["path"],
+            },
+        },
+    },
+    required=["edits"]
+)
+def tool_apply_edits(edits: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Apply multiple find/replace or unified diff edits atomically.
+
+    Rules:
+    - Every file is read once, all edits are applied in memory (in order).
+    - Each `find` (or old side of a diff hunk) must occur exactly once in the (already edited) file content.
+    - If any edit fails, no file is changed.
+
+    Returns:
+      { "ok": bool, "results": [ {"index": i, "path": ..., "ok": True} | {"index": i, "path": ..., "error": ...} ],
+        "files_changed": [...] }
+    """
+    if not edits:
+        return {"error": "no_edits_provided"}
+
+    originals: Dict[Path, str] = dict()
+    contents: Dict[Path, str] = dict()
+    results: List[Dict[str, Any]] = []
+
+    for i, edit in enumerate(edits):
+        path = edit.get("path", "")
+        result = {"index": i, "path": path}
+        results.append(result)
+
+        p = safe_path(path)
+        if p is None:
+            result["error"] = "escapes_root"
+            continue
+
+        if p not in contents:
+            if not p.exists():
+                result["error"] = "not_found"
+                continue
+            if p.is_dir():
+                result["error"] = "is_directory"
+                continue
+            try:
+                originals[p] = contents[p] = p.read_text(encoding="utf-8")
+            except UnicodeDecodeError:
+                result["error"] = "not_utf8_text"
+                continue
+            except Exception as e:
+                result["error"] = f"read_failed: {e}"
+                continue
+
+        if "diff" in edit:
+            replacements = _diff_to_replacements(edit["diff"])
+            if not replacements:
+                result["error"] = "no_hunks_found"
+                continue
+        elif "find" in edit and "replace" in edit:
+            replacements = [(edit["find"], edit["replace"], None)]
+        else:
+            result["error"] = "missing_find_replace_or_diff"
+            continue
+
+        text = contents[p]
+        for find, replace, line in replacements:
+            if find == replace:
+                result["error"] = "find_equals_replace"
+                break
+            if find == "" and line is not None:
+                # insertion without context lines: anchored by the line number of the hunk
+                inserted = _insert_lines(text, line, replace)
+                if inserted is None:
+                    result.update(error="hunk_line_out_of_range", line=line)
+                    break
+                text = inserted
+                continue
+            occurrences = text.count(find)
+            if occurrences != 1:
+                result.update(error="find_not_found" if occurrences == 0 else "find_not_unique", found=occurrences)
+                break
+            text = text.replace(find, replace, 1)
+        else:
+            contents[p] = text
+            result["ok"] = True
+
+    if any("error" in r for r in results):
+        return {"ok": False, "results": results, "files_changed": []}
+
+    # write all changed files (each atomically via temp file), restore the written ones on failure
+    written: List[Path] = []
+    try:
+        for p, text in contents.items():
+            if text == originals[p]:
+                continue
+            tmp = p.with_name(f".{p.name}.lift-tmp")
+            tmp.write_text(text, encoding="utf-8")
+            shutil.copymode(p, tmp)
+            os.replace(tmp, p)
+            written.append(p)
+    except Exception as e:
+        for p in written:
+            p.write_text(originals[p], encoding="utf-8")
+        return {"error": f"Failed to write file: {e}", "results": results, "files_changed": []}
+    finally:
+        for p in contents:
+            p.with_name(f".{p.name}.lift-tmp").unlink(missing_ok=True)
+            _invalidate(p)
+
+    return {"ok": True, "results": results,
+            "files_changed": [p.relative_to(PROJECT_PATH).as_posix() for p in written]}
+
+
+@tool_metadata(
+    description="Search the PUT and the tests for an identifier (exact name, default) or a regex (per line). "
+                "Returns the matching lines with line numbers and surrounding context.",
+    properties={
+        "query": {
+            "type": "string",
+            "description": "Identifier (e.g. function/class/variable name) or regex to search for.",
+        },
+        "regex": {
+            "type": "boolean",
+            "description": "Interpret the query as a regex (matched per line) instead of an identifier.",
+            "default": False,
+        },
+        "path": {
+            "type": "string",
+            "description": "Only search files under this path (relative to repo root).",
+            "default": "",
+        },
+        "context": {
+            "type": "integer",
+            "description": "Number of lines of context before and after each match.",
+            "default": 2,
+            "minimum": 0,
+        },
+        "max_results": {
+            "type": "integer",
+            "description": "Maximum number of matches to return.",
+            "default": 50,
+            "minimum": 1,
+        },
+    },
+    required=["query"],
+    read_only=True
+)
+def tool_search_code(query: str, regex: bool = False, path: str = "", context: int = 2,
+                     max_results: int = 50) -> Dict[str, Any]:
+    """
+    Search the indexed files (PUT & tests) for an identifier or a regex.
+
+    Returns:
+      { "matches": [ {"path": ..., "line": int, "snippet": "<numbered lines>"} ], "total": int, "truncated": bool }
+    """
+    prefix = ""
+    if path and path != ".":
+        p = safe_path(path)
+        if p is None:
+            return {"error": f"Path escapes ROOT: {path}"}
+        prefix = p.relative_to(PROJECT_PATH).as_posix()
+
+    try:
+        matches = CODE_INDEX.search(query, regex, prefix, context)
+    except re.error as e:
+        return {"error": f"invalid_regex: {e}"}
+
+    return {"matches": matches[:max_results], "total": len(matches), "truncated": len(matches) > max_results}
+
+
+@tool_metadata(
+    description="Get the outline of a python module of the PUT: its classes, functions & methods with signatures, "
+                "first docstring line and line ranges (no source code).",
+    properties={"path": {"type": "string", "description": "Python module path relative to repo root."}},
+    required=["path"],
+    read_only=True
+)
+def tool_get_outline(path: str) -> Dict[str, Any]:
+    """
+    Returns the outline of a PUT module.
+
+    Returns:
+      { "path": ..., "symbols": [ {"qualname", "kind", "signature", "doc", "start", "end"} ] }
+    """
+    p = safe_path(path)
+    if p is None:
+        return {"error": f"Path escapes ROOT: {path}"}
+
+    rel = p.relative_to(PROJECT_PATH).as_posix()
+    symbols = SYMBOL_INDEX.outline(rel)
+    if symbols is None:
+        return {"error": f"not_an_indexed_module: {path}"}
+
+    return {"path": rel, "symbols": [{"qualname": s["qualname"], "kind": s["kind"], "signature": s["signature"],
+                                      "doc": s["doc"].split("\n", 1)[0], "start": s["start"], "end": s["end"]}
+                                     for s in symbols]}
+
+
+@tool_metadata(
+    description="Get the definition(s) of a class/function/method of the PUT by name: signature, full docstring, "
+                "line range and (optionally) the source code. Accepts simple names ('parse'), qualified names "
+                "('Parser.parse') and module-prefixed names ('pkg/parser.py:Parser.parse').",
+    properties={
+        "name": {"type": "string", "description": "Symbol name (simple, qualified or module-prefixed)."},
+        "include_source": {
+            "type": "boolean",
+            "description": "Include the source code of the definition.",
+            "default": True,
+        },
+        "max_results": {
+            "type": "integer",
+            "description": "Maximum number of definitions to return.",
+            "default": 10,
+            "minimum": 1,
+        },
+    },
+    required=["name"],
+    read_only=True
+)
+def tool_get_symbol(name: str, include_source: bool = True, max_results: int = 10) -> Dict[str, Any]:
+    """
+    Returns the definitions matching the name.
+
+    Returns:
+      { "symbols": [ {"path", "qualname", "kind", "signature", "doc", "start", "end", "source"?} ], "total": int }
+    """
+    symbols = SYMBOL_INDEX.find(name)
+    if not symbols:
+        return {"error": f"symbol_unknown: {name}"}
+
+    results = []
+    for symbol in symbols[:max_results]:
+        result = {k: symbol[k] for k in ("path", "qualname", "kind", "signature", "doc", "start", "end")}
+        if include_source:
+            p = PROJECT_PATH / symbol["path"]
+            lines = FILE_CACHE.get(p, p.stat()).decode("utf-8", errors="replace").splitlines()
+            result["source"] = "\n".join(lines[symbol["start"] - 1:symbol["end"]])
+        results.append(result)
+
+    return {"symbols": results, "total": len(symbols)}
+
+
 @tool_metadata(
     description="Get all requirements (incl. id, title, description and acceptance) (structured).",
-    properties={}
+    properties={},
+    read_only=True
 )
 def tool_get_all_requirements() -> dict:
     """ Returns the ordered dict of all requirements (structured by scopes). """
@@ -361,17 +688,19 @@ def tool_get_all_requirements() -> dict:
 
 @tool_metadata(
     description="Get the ids of all available requirements.",
-    properties={}
+    properties={},
+    read_only=True
 )
 def tool_get_all_requirement_ids():
     """ Returns all requirement ids. """
-    return {"req_ids": [req.id for req in REQS.get_requirements()]}
+    return {"req_ids": list(REQS.get_requirement_ids())}
 
 
 @tool_metadata(
     description="Get the details of a requirement based on its identifier.",
     properties={"identifier": {"type": "string", "description": "Requirement identifier (id)."}},
-    required=["identifier"]
+    required=["identifier"],
+    read_only=True
 )
 def tool_get_requirement_data(identifier: str):
     """ Returns the requirement details based on its identifier (if available). """
@@ -384,7 +713,8 @@ def tool_get_requirement_data(identifier: str):
 
 @tool_metadata(
     description="Get all test cases that include a reference to a non-existent requirement.",
-    properties={}
+    properties={},
+    read_only=True
 )
 def tool_get_tests_with_invalid_reqs():
     """ Returns the list of testcases that reference a non-existent requirement identifier. """
@@ -396,6 +726,99 @@ def tool_get_tests_with_invalid_reqs():
     return {"tests": [test.to_dict() for test in tests]}
 
 
+@tool_metadata(
+    description="Get the requirements that are not covered by any (non-skipped) test or only by failing tests in "
+                "the last execution, incl. the changes since the previous execution. Optionally includes the full "
+                "requirement x test traceability matrix (linked tests with their outcomes per requirement and, if "
+                "the per-test coverage is recorded, the number of PUT lines per file covered by them).",
+    properties={
+        "include_matrix": {
+            "type": "boolean",
+            "description": "Include the full traceability matrix.",
+            "default": False,
+        },
+    },
+    read_only=True
+)
+def tool_get_uncovered_requirements(include_matrix: bool = False):
+    """
+    Returns the requirement ids without (passing) tests based on the traceability matrix of the last execution.
+
+    Returns:
+      { "uncovered": [...], "failing": [...], "changes": {...},
+        "matrix"?: {req_id: {"status", "tests", "covered_lines"?: {path: int}}} }
+    """
+    if get_current_suite() is None:
+        return {"error": "no_execution_report_generated"}
+
+    matrix = get_traceability_matrix()
+    req_ids = list(REQS.get_requirement_ids())
+    result = {"uncovered": [id_ for id_ in req_ids if matrix.status(id_) == "uncovered"],
+              "failing": [id_ for id_ in req_ids if matrix.status(id_) == "failing"],
+              "changes": matrix.changes}
+    if include_matrix:
+        result["matrix"] = matrix.to_dict(req_ids)
+    return result
+
+
+@tool_metadata(
+    description="Get the uncovered line ranges and partially covered branches of a module of the PUT from the last "
+                "coverage report. For a directory (default: all modules), returns the coverage summary per module.",
+    properties={
+        "path": {
+            "type": "string",
+            "description": "Module or directory path relative to repo root.",
+            "default": ".",
+        },
+    },
+    read_only=True
+)
+def tool_get_uncovered_lines(path: str = ".") -> Dict[str, Any]:
+    """
+    Returns the uncovered lines of a module (or the summaries of all modules under a directory).
+
+    Returns:
+      { "path": ..., "line_rate": float, "branch_rate": float, "uncovered": ["4", "8-12"],
+        "partial_branches": [ {"line", "covered", "total", "missing"} ] }
+      or { "line_rate": float, "branch_rate": float, "modules": {path: summary} }
+    """
+    coverage = get_current_coverage()
+    if coverage is None:
+        return {"error": "no_coverage_report_generated"}
+
+    p = safe_path(path)
+    if p is None:
+        return {"error": f"Path escapes ROOT: {path}"}
+    rel = p.relative_to(PROJECT_PATH).as_posix()
+
+    module = coverage.files.get(rel)
+    if module is not None:
+        return {"path": rel, "line_rate": module.line_rate, "branch_rate": module.branch_rate,
+                "uncovered": module.uncovered_ranges(), "partial_branches": module.partial_branches()}
+
+    modules = {file: cov.summary() for file, cov in sorted(coverage.files.items())
+               if rel == "." or file.startswith(rel + "/")}
+    if not modules:
+        return {"error": f"no_coverage_data: {path}"}
+
+    return {"line_rate": coverage.line_rate, "branch_rate": coverage.branch_rate, "modules": modules}
+
+
+@tool_metadata(
+    description="Get the coverage changes since the previous test execution: line/branch rate deltas (total and per "
+                "module) and the newly covered/uncovered line ranges per module.",
+    properties={},
+    read_only=True
+)
+def tool_get_coverage_delta() -> Dict[str, Any]:
+    """ Returns the coverage delta between the last two executions (the first execution is compared to nothing). """
+    delta = get_coverage_delta()
+    if delta is None:
+        return {"error": "no_coverage_report_generated"}
+
+    return delta
+
+
 @tool_metadata(
     description="Calling this function indicates the intent to end the conversation after completing all tasks. "
                 "Fails if a required output is missing or the final_text is not a valid value.",
@@ -407,8 +830,10 @@ def tool_end_conversation(final_text: str):
 
 
 available_tools = [tool_list_dir, tool_read_file, tool_write_file, tool_delete_path, tool_replace_in_file,
-                   tool_get_all_requirements, tool_get_all_requirement_ids, tool_get_requirement_data,
-                   tool_get_tests_with_invalid_reqs, tool_end_conversation]
+                   tool_apply_edits, tool_search_code, tool_get_outline, tool_get_symbol, tool_get_all_requirements,
+                   tool_get_all_requirement_ids, tool_get_requirement_data, tool_get_tests_with_invalid_reqs,
+                   tool_get_uncovered_requirements, tool_get_uncovered_lines, tool_get_coverage_delta,
+                   tool_end_conversation]
 
 
 def get_available_tools():
@@ -429,3 +854,4 @@ def get_available_tools():
 
 # ---- Tool registry ----
 TOOLS_IMPL, TOOLS_SPEC = get_available_tools()
+READ_ONLY_TOOLS = {name for name, tool in TOOLS_IMPL.items() if tool.read_only}
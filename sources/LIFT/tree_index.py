@@ -0,0 +1,119 @@
+import os
+import re
+from pathlib import Path
+from threading import Lock
+
+
+def _excluded(name: str, include_hidden: bool) -> bool:
+    """ Caches are always excluded, hidden entries only if not included. """
+    return "cache" in name or (not include_hidden and name.startswith("."))
+
+
+def _segment_regex(segment: str) -> str:
+    """ Translates a glob segment (*, ?, [...]) to a regex not matching across directories. """
+    regex, i = "", 0
+    while i < len(segment):
+        char = segment[i]
+        end = segment.find("]", i + 2) if char == "[" else -1
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif end != -1:
+            content = segment[i + 1:end].replace("\\", "\\\\").replace("[", "\\[")
+            regex += "[" + ("^" + content[1:] if content.startswith("!") else content) + "]"
+            i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def glob_regex(pattern: str) -> re.Pattern:
+    """ Translates the glob pattern to a regex matching the paths (relative posix paths) Path.rglob(pattern) yields,
+    i.e. the pattern is matched at any depth and '**' matches any number of directories. A trailing '**' only matches
+    directories, which have to be matched with a trailing '/'. """
+    segments = [s for s in pattern.split("/") if s not in ["", "."]] or ["*"]
+    regex = "(?:[^/]+/)*"
+    for i, segment in enumerate(segments):
+        if segment == "**":
+            regex += "(?:[^/]+/)*"
+        else:
+            regex += _segment_regex(segment) + ("" if i == len(segments) - 1 else "/")
+    return re.compile(regex)
+
+
+class TreeIndex:
+    """ In-memory index of the directory entries (name, is_dir, size) per directory. Listings are served from the
+    index without touching the file system; only directories invalidated by a tool (write/replace/delete) are
+    re-scanned. Changes made outside the tools (test execution, restored suites) are not detected, so the index is
+    cleared before every agent conversation. """
+
+    def __init__(self):
+        self._dirs: dict[Path, list[tuple[str, bool, int]]] = dict()
+        self._lock = Lock()
+
+    def children(self, directory: Path) -> list[tuple[str, bool, int]]:
+        with self._lock:
+            cached = self._dirs.get(directory)
+        if cached is not None:
+            return cached
+
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    entries.append((entry.name, is_dir, 0 if is_dir else entry.stat().st_size))
+                except OSError:
+                    continue
+        with self._lock:
+            self._dirs[directory] = entries
+        return entries
+
+    def invalidate(self, path: Path) -> None:
+        """ Drops the path (incl. everything below) and its parent directories from the index. """
+        with self._lock:
+            for directory in [d for d in self._dirs if d == path or path in d.parents or d in path.parents]:
+                self._dirs.pop(directory)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirs.clear()
+
+    def walk(self, root: Path, start: Path, pattern: str, include_hidden: bool) -> list[dict]:
+        """ Recursively lists the entries under start matching the glob pattern (with the semantics of rglob, except
+        that start itself is never listed).
+        Excluded directories (caches & hidden ones) are pruned before descending. Paths are returned relative to
+        root. """
+        if any(_excluded(part, include_hidden) for part in start.relative_to(root).parts):
+            return []
+
+        matches = glob_regex(pattern).fullmatch
+        dirs_only = pattern.rstrip("/").split("/")[-1] == "**"
+        prefix = start.relative_to(root).as_posix()
+        prefix = "" if prefix == "." else prefix + "/"
+
+        entries, stack = [], [(start, "")]
+        while stack:
+            directory, rel_dir = stack.pop()
+            for name, is_dir, size in self.children(directory):
+                if _excluded(name, include_hidden):
+                    continue
+
+                rel = rel_dir + name
+                if is_dir:
+                    stack.append((directory / name, rel + "/"))
+
+                if not matches(rel + "/" if is_dir and dirs_only else rel):
+                    continue
+
+                if is_dir:
+                    entries.append({"path": prefix + rel + "/", "is_directory": True})
+                else:
+                    entries.append({"path": prefix + rel, "is_file": True, "bytes_size": size})
+
+        return entries
+
+
+TREE_INDEX = TreeIndex()
@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logging import getLogger
+from multiprocessing import Manager
+from pathlib import Path
+from typing import Callable
+
+from .config import LiftConfig
+from .metrics import aggregate_trials
+from .paths import Paths
+from .process import Process
+from .models import litellm_model
+from .rate_limits import init_provider_budgets, init_rate_limiters, RateLimiterManager
+
+LOGGER = getLogger(__name__)
+
+
+def _run_trial(root: Path, inputs: Path, env_file: Path, trial: int, budgets: dict, limiters: dict,
+               log_setup: Callable[[Path], None] | None, resume: bool = False) -> int:
+    """ Runs (or resumes) a single isolated LIFT trial (executed in a worker process). Returns the trial id. """
+    if log_setup is not None:
+        config = LiftConfig(env_file)
+        log_setup(Paths(root, inputs, config.put_name, trial).logs)
+
+    init_provider_budgets(budgets)
+    init_rate_limiters(limiters)
+    Process(root, inputs, env_file, trial, resume).run()
+    return trial
+
+
+class TrialScheduler:
+    def __init__(self, root: Path, inputs: Path, env_file: Path, log_setup: Callable[[Path], None] | None = None,
+                 resume: bool = False):
+        self._root = root
+        self._inputs = inputs
+        self._env_file = env_file
+        self._log_setup = log_setup
+        self._resume = resume
+
+        self._config = LiftConfig(env_file)
+
+    def run(self) -> list[int]:
+        """ Runs all configured trials on a process pool. Returns the ids of the trials that concluded. """
+        trials, workers = self._config.trials, min(self._config.trial_workers, self._config.trials)
+        LOGGER.info(f"Starting {trials} trials with {workers} parallel workers")
+
+        concluded = []
+        with Manager() as manager, RateLimiterManager() as limiter_manager:
+            budgets = {provider: manager.BoundedSemaphore(limit)
+                       for provider, limit in self._config.provider_concurrency.items()}
+
+            # rate limiters shared by all trials (one per model)
+            models = {litellm_model(m) for m in [self._config.generator, self._config.debugger, self._config.evaluator]}
+            limiters = {model: limiter_manager.RateLimiter() for model in models}
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_run_trial, self._root, self._inputs, self._env_file, trial, budgets,
+                                       limiters, self._log_setup, self._resume): trial for trial in range(trials)}
+
+                for future in as_completed(futures):
+                    trial = futures[future]
+                    try:
+                        concluded.append(future.result())
+                        LOGGER.info(f"Trial {trial:02d} concluded!")
+                    except Exception as e:
+                        LOGGER.error(f"Trial {trial:02d} failed: {e}")
+
+        LOGGER.info(f"All trials finished ({len(concluded)}/{trials} concluded)!")
+
+        # aggregate token & latency metrics of all trials
+        trial_paths = [Paths(self._root, self._inputs, self._config.put_name, trial) for trial in range(trials)]
+        aggregate_trials([p.metrics for p in trial_paths], Paths(self._root, self._inputs, self._config.put_name)
+                         .archive / "metrics.json")
+
+        return sorted(concluded)
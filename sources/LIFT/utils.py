@@ -1,19 +1,25 @@
-import shutil, subprocess, sys
+import shutil
 from logging import getLogger
 from pathlib import Path
 
+from .archiving import checkout_suite
+from .code_index import CODE_INDEX
 from .config import LiftConfig
+from .coverage_utils import parse_cur_cov_report
+from .execution import execute_tests_impacted, execute_tests_incremental, execute_tests_parallel
+from .impact import IMPACT_INDEX_NAME
 from .paths import Paths
 from .requirements import ReqScope
+from .symbol_index import SYMBOL_INDEX
 
 LOGGER = getLogger(__name__)
 
 from .report_utils import parse_cur_exec_report
 
 
-def check_inputs(config: LiftConfig, paths: Paths) -> None:
-    # project existing
-    if paths.project.exists():
+def check_inputs(config: LiftConfig, paths: Paths, resume: bool = False) -> None:
+    # project existing (only allowed if an interrupted run is resumed)
+    if paths.project.exists() and not resume:
         LOGGER.error(f"LIFT folder already exists at {paths.project.absolute()}. No LIFT process started!")
         raise Exception("LIFT folder already exists!")
 
@@ -49,7 +55,7 @@ def check_inputs(config: LiftConfig, paths: Paths) -> None:
 
 def setup_new_project(config: LiftConfig, paths: Paths, reqs: ReqScope) -> None:
     # create project folder
-    paths.project.mkdir()
+    paths.project.mkdir(parents=True)
 
     # copy PUT
     shutil.copytree((paths.inputs / config.put_name), paths.put)
@@ -76,34 +82,77 @@ def setup_new_project(config: LiftConfig, paths: Paths, reqs: ReqScope) -> None:
         file.writelines(new_lines)
 
     # create archive & project folders
-    paths.archive.mkdir(exist_ok=True)
+    paths.archive.mkdir(parents=True, exist_ok=True)
     paths.conversation_archive.mkdir(exist_ok=True)
     paths.tests.mkdir()
     paths.reports.mkdir()
 
+    build_indices(paths)
+
     LOGGER.info("Setup finished!")
 
 
-def execute_tests(put_name: str, paths: Paths) -> bool:
-    """ Executes the current state of the test suite and parses the generated report. Returns True if all tests passed. """
-    exec_report_file = (paths.reports / 'execution-report.xml')
+def build_indices(paths: Paths) -> None:
+    # index PUT & tests for the search_code tool
+    CODE_INDEX.build(paths.project, [paths.put, paths.tests])
+    # symbol outline of the PUT (cached on disk by file hash) for the get_outline/get_symbol tools
+    SYMBOL_INDEX.build(paths.project, paths.put, paths.cache / "symbols")
+
+
+def execute_tests(put_name: str, paths: Paths, incremental: bool = False, workers: int = 1,
+                  impact: bool = False) -> bool:
+    """ Executes the current state of the test suite and parses the generated report. Returns True if all tests passed.
+    If incremental, only the test modules changed since the last execution are executed. With multiple workers, the
+    test modules are sharded over parallel pytest processes. If impact, the per-test coverage (test-impact index) is
+    recorded and stored with the reports. """
+    impact_index = paths.cache / IMPACT_INDEX_NAME if impact else None
+
+    if incremental:
+        passing = execute_tests_incremental(put_name, paths, workers, impact_index)
+    else:
+        # also for a single worker: the coverage report is written from the collected coverage data (incl. the
+        # import-time coverage of the warm worker, added after pytest-cov wrote its report)
+        passing = execute_tests_parallel(put_name, paths, workers, impact_index)
+
+    # store the test-impact index with the reports (archived with them & the FSS/LPS, loaded with the reports)
+    (paths.reports / IMPACT_INDEX_NAME).unlink(missing_ok=True)
+    if impact_index is not None and impact_index.exists():
+        shutil.copy(impact_index, paths.reports / IMPACT_INDEX_NAME)
+
+    _process_reports(paths)
+
+    return passing
 
-    # execute pytest as a subprocess
-    e = subprocess.run([sys.executable, "-m", "pytest", paths.project.absolute(),
-                        f"--rootdir={paths.project.absolute()}",
-                        f"--cache-clear", f"--disable-warnings",
-                        f"--junit-xml={exec_report_file.absolute()}",
-                        f"--cov={put_name}", f"--cov-branch",
-                        f"--cov-report=xml:{(paths.reports / 'coverage-report.xml').absolute()}"])
 
-    # parse the last execution report
-    parse_cur_exec_report(exec_report_file)
+def execute_regression(put_name: str, paths: Paths, suite: Path, workers: int = 1) -> bool:
+    """ Executes the tests of an archived suite manifest (e.g. FSS/LPS) impacted by the changes of the current PUT
+    version, based on the test-impact index stored with the suite. Returns True if all executed tests passed. """
+    suite_reports = paths.cache / "regression"
+    shutil.rmtree(suite_reports, ignore_errors=True)
+    checkout_suite(suite, paths.tests, suite_reports)
+
+    impact_index = suite_reports / IMPACT_INDEX_NAME
+    if not impact_index.exists():
+        LOGGER.error(f"Test-impact index not found in suite {suite.absolute()} (enable LIFT_IMPACT_INDEX)!")
+        raise FileNotFoundError("Test-impact index (impact-index.json) missing!")
+
+    passing = execute_tests_impacted(put_name, paths, impact_index, workers)
+    _process_reports(paths)
+    return passing
+
+
+def load_reports(paths: Paths) -> None:
+    # parse the last execution & coverage reports
+    parse_cur_exec_report(paths.reports / 'execution-report.xml', paths.reports / IMPACT_INDEX_NAME)
+    parse_cur_cov_report(paths.reports / 'coverage-report.xml', paths.project)
+
+
+def _process_reports(paths: Paths) -> None:
+    load_reports(paths)
 
     # remove pytest-html-report temp files
     rm_report_temps(paths.reports)
 
-    return e.returncode == 0
-
 
 def rm_report_temps(reports_dir: Path) -> None:
-    [file.unlink() for file in reports_dir.glob("*.json")]
+    [file.unlink() for file in reports_dir.glob("*.json") if file.name != IMPACT_INDEX_NAME]
@@ -1,3 +1,4 @@
+import argparse
 import logging
 import logging.config
 from datetime import datetime
@@ -5,7 +6,8 @@ from pathlib import Path
 
 import litellm
 
-from LIFT import Process as LiftProcess
+from LIFT import Process as LiftProcess, TrialScheduler
+from LIFT.config import LiftConfig
 from logging_config import CONFIG
 
 
@@ -30,6 +32,14 @@ def setup_logging(log_dir=Path("logs")):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="LIFT - LLM-based iterative test suite generation")
+    parser.add_argument("--regression", type=Path, metavar="SUITE",
+                        help="only execute the tests of an archived suite (e.g. .archive/manifests/LPS.json) impacted "
+                             "by the changes of the current PUT version (requires the suite's test-impact index)")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume an interrupted run (all trials) at the phase after its last checkpoint")
+    args = parser.parse_args()
+
     # setup folders
     lift_root = Path(".").resolve()
     if not lift_root.is_dir():
@@ -47,8 +57,16 @@ def main():
     log_dir = (lift_root / ".logs").resolve()
     setup_logging(log_dir)
 
-    # start LIFT
-    LiftProcess(lift_root, input_dir, env_file).run()
+    # regression run of an archived suite on a changed PUT
+    if args.regression is not None:
+        LiftProcess(lift_root, input_dir, env_file).regress(args.regression)
+        return
+
+    # start LIFT (single trial or multiple isolated trials in parallel)
+    if LiftConfig(env_file).trials > 1:
+        TrialScheduler(lift_root, input_dir, env_file, log_setup=setup_logging, resume=args.resume).run()
+    else:
+        LiftProcess(lift_root, input_dir, env_file, resume=args.resume).run()
 
 
 if __name__ == "__main__":